@@ -0,0 +1,142 @@
+"""Benchmarks of pylinky against a local mock of the Enedis gateway.
+
+    python -m benchmarks.bench --meters 50 --latency 0.02
+    python -m benchmarks.bench --save baseline.json
+    python -m benchmarks.bench --compare baseline.json --tolerance 0.2
+
+Each scenario reports throughput, latency percentiles and peak traced memory.
+With --compare, the run fails when a scenario is slower than the baseline by
+more than the tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# The mock server speaks plain HTTP
+os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')
+
+from pylinky import AbstractAuth, LinkyClient  # noqa: E402
+from pylinky.client import HOURLY  # noqa: E402
+from pylinky.ratelimit import RateLimiter  # noqa: E402
+
+from benchmarks.mock_enedis import MockEnedisServer, meter_reading  # noqa: E402
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+    return samples[index]
+
+
+def measure(name, func, iterations, operations=1):
+    """Run func iterations times, return its statistics.
+
+    Memory is traced during one extra run only, tracing slows everything down.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "name": name,
+        "iterations": iterations,
+        "throughput": iterations * operations / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_kib": peak / 1024.0,
+    }
+
+
+def make_auth(server):
+    # No quota against the mock, keep retries out of the measures
+    return AbstractAuth(token=server.token(), client_id="bench", client_secret="bench",
+                        base_url=server.base_url, rate_limiter=RateLimiter(quotas=[]))
+
+
+def run(args):
+    usage_point_ids = ["{:014d}".format(i) for i in range(args.meters)]
+    results = []
+    with MockEnedisServer(usage_point_ids, latency=args.latency, step=args.step) as server:
+        # Every iteration must reach the mock, not the response cache
+        client = LinkyClient(make_auth(server), response_ttl=0)
+        results.append(measure("fetch_data", client.fetch_data, args.iterations, operations=4))
+        results.append(measure("fetch_data_derived", lambda: client.fetch_data(derive_aggregates=True),
+                               args.iterations, operations=4))
+
+        load_curve = meter_reading("/v4/metering_data/consumption_load_curve", usage_point_ids[0],
+                                   "2019-01-01", "2020-01-01", step=args.step)
+        load_curve['period_type'] = HOURLY
+
+        # Not a stored period, parsed and formatted again on every call
+        results.append(measure("format_data_year", lambda: client.format_data(load_curve), args.iterations,
+                               operations=len(load_curve['interval_reading'])))
+        results.append(measure("get_data", client.get_data, args.iterations * 100, operations=4))
+
+        results.append(measure("sweep", lambda: client.fetch_batch(usage_point_ids, max_workers=args.workers),
+                               max(1, args.iterations // 5), operations=len(usage_point_ids) * 4))
+        client.close_session()
+    return results
+
+
+def report(results):
+    print("{:<20} {:>8} {:>14} {:>10} {:>10} {:>10} {:>12}".format(
+        "scenario", "runs", "ops/s", "p50 ms", "p95 ms", "p99 ms", "peak KiB"))
+    for r in results:
+        print("{name:<20} {iterations:>8} {throughput:>14.1f} {p50_ms:>10.2f} {p95_ms:>10.2f} {p99_ms:>10.2f} "
+              "{peak_kib:>12.1f}".format(**r))
+
+
+def compare(results, baseline, tolerance):
+    """Return the scenarios whose throughput regressed beyond tolerance."""
+    reference = dict((r["name"], r) for r in baseline)
+    regressions = []
+    for r in results:
+        ref = reference.get(r["name"])
+        if ref and r["throughput"] < ref["throughput"] * (1 - tolerance):
+            regressions.append("{}: {:.1f} ops/s, baseline {:.1f} ops/s".format(
+                r["name"], r["throughput"], ref["throughput"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--meters', type=int, default=20, help='Usage points served by the mock')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock answer latency in seconds')
+    parser.add_argument('--step', type=int, default=30, help='Load curve step in minutes')
+    parser.add_argument('--iterations', type=int, default=20, help='Runs per scenario')
+    parser.add_argument('--workers', type=int, default=8, help='Workers of the multi-meter sweep')
+    parser.add_argument('--save', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput loss, 0.2 is 20%%')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    report(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Cold start time of pylinky entry points.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --max-ms 50
+
+Each statement runs in a fresh interpreter, the interpreter start up alone is
+measured too and subtracted. With --max-ms, the run fails when an entry point
+takes longer than that on top of the bare interpreter.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    ("import pylinky", "import pylinky"),
+    ("client constants", "from pylinky.client import HOURLY"),
+    ("cli", "import pylinky.__main__"),
+    ("cli --help", "import sys; sys.argv = ['pylinky', '--help']\n"
+                   "import runpy\n"
+                   "try:\n    runpy.run_module('pylinky', run_name='__main__')\nexcept SystemExit:\n    pass"),
+]
+
+
+def timed_run(statement):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def measure(statement, iterations):
+    """Best wall time of iterations fresh interpreters, in milliseconds."""
+    return min(timed_run(statement) for _ in range(iterations)) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=10, help='Interpreters started per entry point')
+    parser.add_argument('--max-ms', type=float, help='Fail above this many milliseconds over a bare interpreter')
+    args = parser.parse_args(argv)
+
+    bare = measure("pass", args.iterations)
+    print("{:<20} {:>10}".format("entry point", "ms"))
+    print("{:<20} {:>10.1f}".format("bare interpreter", bare))
+    failures = []
+    for name, statement in ENTRY_POINTS:
+        elapsed = measure(statement, args.iterations) - bare
+        print("{:<20} {:>10.1f}".format(name, elapsed))
+        if args.max_ms is not None and elapsed > args.max_ms:
+            failures.append("{}: {:.1f} ms, limit {:.1f} ms".format(name, elapsed, args.max_ms))
+    for failure in failures:
+        print("REGRESSION " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Local stand-in for the Enedis Data Connect gateway.
+
+Serves the OAuth token endpoint and every SCOPE path of pylinky.linkyapi.
+Metering endpoints answer with realistic interval_reading payloads covering
+the requested [start, end) window, after an optional latency.
+"""
+import datetime
+import itertools
+import json
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from pylinky.abstractauth import TOKEN_PATH
+from pylinky.linkyapi import SCOPE
+
+# Minutes between two readings of a load curve
+LOAD_CURVE_STEP = 30
+
+_LOAD_CURVES = (SCOPE['CONSUMPTION_LOAD_CURVE'], SCOPE['PRODUCTION_LOAD_CURVE'])
+_DAILY = (SCOPE['DAILY_CONSUMPTION'], SCOPE['DAILY_PRODUCTION'], SCOPE['DAILY_CONSUMPTION_MAX_POWER'])
+
+_CUSTOMERS = {
+    SCOPE['IDENTITY']: {"identity": {"natural_person": {"title": "M.", "firstname": "Jean", "lastname": "Dupont"}}},
+    SCOPE['CONTACT_DATA']: {"contact_data": {"phone": "0600000000", "email": "jean.dupont@example.com"}},
+    SCOPE['CONTRACTS']: {"usage_point": {"usage_point_status": "com", "meter_type": "AMM"},
+                         "contracts": {"subscribed_power": "9 kVA", "offpeak_hours": "HC (22H00-6H00)"}},
+    SCOPE['ADDRESSES']: {"usage_point": {"usage_point_addresses": {"street": "1 rue de la Paix", "postal_code": "75002",
+                                                                   "city": "Paris", "country": "France"}}},
+}
+
+
+def _value(usage_point_id, date, low, high):
+    """Deterministic value of a reading, whatever the window it is requested in."""
+    return str(low + zlib.crc32((usage_point_id + date).encode("ascii")) % (high - low))
+
+
+def meter_reading(path, usage_point_id, start, end, step=LOAD_CURVE_STEP):
+    """Build the meter_reading Enedis returns for a metering path and window."""
+    start_date = datetime.datetime.strptime(start, "%Y-%m-%d")
+    end_date = datetime.datetime.strptime(end, "%Y-%m-%d")
+    points = []
+    if path in _LOAD_CURVES:
+        delta = datetime.timedelta(minutes=step)
+        date = start_date + delta
+        while date <= end_date:
+            stamp = date.strftime("%Y-%m-%d %H:%M:%S")
+            points.append({"value": _value(usage_point_id, stamp, 0, 4000), "date": stamp,
+                           "interval_length": "PT{}M".format(step), "measure_type": "B"})
+            date += delta
+        reading_type = {"unit": "W", "measurement_kind": "power", "aggregate": "average"}
+    else:
+        date = start_date
+        while date < end_date:
+            stamp = date.strftime("%Y-%m-%d")
+            points.append({"value": _value(usage_point_id, stamp, 1000, 40000), "date": stamp})
+            date += datetime.timedelta(days=1)
+        reading_type = {"unit": "Wh", "measurement_kind": "energy", "aggregate": "sum",
+                        "measuring_period": "P1D"}
+    return {"usage_point_id": usage_point_id, "start": start, "end": end, "quality": "BRUT",
+            "reading_type": reading_type, "interval_reading": points}
+
+
+class MockEnedisServer(object):
+    """Threaded HTTP server answering like the Enedis gateway.
+
+    latency is added to every metering and customers answer, in seconds.
+    usage_point_ids are returned in the token, like Enedis does.
+    """
+
+    def __init__(self, usage_point_ids=("12345678901234",), latency=0.0, step=LOAD_CURVE_STEP, port=0):
+        self.usage_point_ids = list(usage_point_ids)
+        self.latency = latency
+        self.step = step
+        self.requests = 0
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{}".format(self._server.server_address[1])
+
+    def token(self):
+        # Every token issued is a new one, like Enedis does on refresh
+        number = next(self._tokens)
+        return {"access_token": "mock-access-token-{}".format(number),
+                "refresh_token": "mock-refresh-token-{}".format(number),
+                "token_type": "Bearer", "expires_in": 12600, "expires_at": time.time() + 12600,
+                "usage_points_id": ",".join(self.usage_point_ids)}
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                # Headers and body are written separately, don't let Nagle delay the body
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _answer(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                server._count()
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if urlparse(self.path).path != TOKEN_PATH:
+                    return self._answer(404, {"error": "not_found"})
+                self._answer(200, server.token())
+
+            def do_GET(self):
+                server._count()
+                url = urlparse(self.path)
+                query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+                if server.latency:
+                    time.sleep(server.latency)
+                if url.path in _CUSTOMERS:
+                    return self._answer(200, [{"customer": dict(_CUSTOMERS[url.path],
+                                                                customer_id="-1")}])
+                if url.path in _LOAD_CURVES + _DAILY:
+                    if query.get('usage_point_id') not in server.usage_point_ids:
+                        return self._answer(403, {"error": "ADAM-ERR0069",
+                                                  "error_description": "no consent for this usage point"})
+                    return self._answer(200, {"meter_reading": meter_reading(
+                        url.path, query['usage_point_id'], query['start'], query['end'], server.step)})
+                self._answer(404, {"error": "not_found"})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,3 +1,23 @@
-from pylinky.client import AbstractAuth
-from pylinky.client import LinkyAPI
-from pylinky.client import LinkyClient
+import importlib
+
+# Loaded on first access (PEP 562) so that importing pylinky stays cheap
+_EXPORTS = {
+    'AbstractAuth': 'pylinky.abstractauth',
+    'LinkyAPI': 'pylinky.linkyapi',
+    'LinkyClient': 'pylinky.client',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
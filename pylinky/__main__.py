@@ -1,13 +1,81 @@
 import argparse
+import logging
+import os
 import sys
-import json
 from urllib.parse import urlparse, parse_qs
 
 from pylinky import LinkyAPI, AbstractAuth, LinkyClient
+from pylinky.customer import CUSTOMER_SCOPES, CustomerCache
+from pylinky.daemon import Poller, TokenFile
+from pylinky.metrics import Metrics
+
+START = "2020-03-01"
+END = "2020-03-05"
+
+
+def _customer_calls(usage_point_id):
+    return [(name, (usage_point_id,)) for name in CUSTOMER_SCOPES.values()]
+
+
+def _metering_calls(usage_point_id):
+    return [
+        ("get_consumption_load_curve", (usage_point_id, START, END)),
+        ("get_production_load_curve", (usage_point_id, START, END)),
+        ("get_daily_consumption_max_power", (usage_point_id, START, END)),
+        ("get_daily_consumption", (usage_point_id, START, END)),
+        ("get_daily_production", (usage_point_id, START, END)),
+    ]
+
+
+def _calls(usage_point_id):
+    """LinkyAPI method names and arguments exercised for each usage point."""
+    return _customer_calls(usage_point_id) + _metering_calls(usage_point_id)
+
+
+async def fetch_all_concurrently(auth, usage_point_ids):
+    """Run every call for every usage point at the same time."""
+    import asyncio
+    from pylinky.aioabstractauth import AsyncAbstractAuth
+    from pylinky.aiolinkyapi import AsyncLinkyAPI
+
+    async_auth = AsyncAbstractAuth(token=auth._oauth.token, client_id=auth.client_id,
+                                   client_secret=auth.client_secret, redirect_url=auth.redirect_url,
+                                   token_updater=auth.token_updater, sandbox=auth.sandbox,
+                                   base_url=auth._base_url)
+    async_api = AsyncLinkyAPI(async_auth)
+    try:
+        jobs = [(usage_point_id, name, getattr(async_api, name)(*args_))
+                for usage_point_id in usage_point_ids for name, args_ in _calls(usage_point_id)]
+        responses = await asyncio.gather(*[job[2] for job in jobs])
+        for (usage_point_id, name, _), response in zip(jobs, responses):
+            print(usage_point_id)
+            print(name)
+            print(await response.read())
+    finally:
+        await async_api.close_session()
+
+
+def run_daemon(args):
+    """Sync every usage point of the saved token daily, until interrupted."""
+    logging.basicConfig(level=logging.INFO)
+    from pylinky.export import CsvSink, ParquetSink
+    from pylinky.sync import SyncState
+
+    tokens = TokenFile(args.token_file)
+    auth = AbstractAuth(token=tokens.load(), client_id=args.client_id, client_secret=args.client_secret,
+                        redirect_url=args.redirect_url, token_updater=tokens.save, background_refresh=True)
+    sink = ParquetSink(args.export_dir) if args.export_format == 'parquet' else CsvSink(args.export_dir)
+    state_file = args.state_file or os.path.join(args.export_dir, ".pylinky-sync.json")
+    client = LinkyClient(auth, sync_state=SyncState(state_file), sinks=[sink])
+    poller = Poller(client)
+    try:
+        poller.run_forever()
+    except KeyboardInterrupt:
+        poller.stop()
+    finally:
+        client.close_session()
+    return 0
 
-import logging
-import contextlib
-from http.client import HTTPConnection
 
 def main():
     """Main function"""
@@ -20,12 +88,29 @@ def main():
                         required=True, help='Redirect URL as stated in the Enedis admin console')
     parser.add_argument('-t', '--test-consumer',
                         required=False, help='Test consumer for sandbox 0-9')
+    parser.add_argument('-a', '--concurrent',
+                        required=False, action='store_true',
+                        help='Fetch all usage points concurrently (requires aiohttp)')
     parser.add_argument('-v', '--verbose',
                         required=False, action='store_true', help='Verbose, debug network calls')
+    parser.add_argument('-d', '--daemon',
+                        required=False, action='store_true',
+                        help='Sync daily once Enedis has published the data, using the token of --token-file')
+    parser.add_argument('--token-file',
+                        required=False, help='JSON file of the OAuth token, updated on refresh (daemon)')
+    parser.add_argument('--export-dir',
+                        required=False, default='.', help='Directory the readings are exported to (daemon)')
+    parser.add_argument('--export-format',
+                        required=False, choices=('csv', 'parquet'), default='csv', help='Export format (daemon)')
+    parser.add_argument('--state-file',
+                        required=False, help='JSON file of the sync high-water marks (daemon)')
+    parser.add_argument('-m', '--metrics',
+                        required=False, action='store_true', help='Print request metrics (OpenMetrics) at the end')
     args = parser.parse_args()
 
     if (args.verbose):
         '''Switches on logging of the requests module.'''
+        from http.client import HTTPConnection
         HTTPConnection.debuglevel = 2
         logging.basicConfig()
         logging.getLogger().setLevel(logging.DEBUG)
@@ -33,9 +118,18 @@ def main():
         requests_log.setLevel(logging.DEBUG)
         requests_log.propagate = True
 
+    if args.daemon:
+        if not args.token_file:
+            parser.error("--daemon requires --token-file")
+        return run_daemon(args)
+
     test_consumer = args.test_consumer
 
-    auth = AbstractAuth(client_id=args.client_id, client_secret=args.client_secret, redirect_url=args.redirect_url)
+    metrics = Metrics()
+    # With --token-file the token is saved for a later --daemon run
+    token_updater = TokenFile(args.token_file).save if args.token_file else None
+    auth = AbstractAuth(client_id=args.client_id, client_secret=args.client_secret, redirect_url=args.redirect_url,
+                        token_updater=token_updater, observers=[metrics] if args.metrics else ())
     linky_api = LinkyAPI(auth)
 
     try:
@@ -54,59 +148,30 @@ def main():
         usage_point_ids = linky_api.get_usage_point_ids()
 
 
-        for usage_point_id in usage_point_ids:
-            print(usage_point_id)
-
-            response = linky_api.get_customer_identity(usage_point_id)
-            print("get_customer_identity")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_customer_contact_data(usage_point_id)
-            print("get_customer_contact_data")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_customer_usage_points_contracts(usage_point_id)
-            print("get_customer_usage_points_contracts")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_customer_usage_points_addresses(usage_point_id)
-            print("get_customer_usage_points_addresses")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_consumption_load_curve(usage_point_id, "2020-03-01", "2020-03-05")
-            print("get_consumption_load_curve")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_production_load_curve(usage_point_id, "2020-03-01", "2020-03-05")
-            print("get_production_load_curve")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_daily_consumption_max_power(usage_point_id, "2020-03-01", "2020-03-05")
-            print("get_daily_consumption_max_power")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_daily_consumption(usage_point_id, "2020-03-01", "2020-03-05")
-            print("get_daily_consumption")
-            print(response.content)
-            #input("Press a key")
-
-            response = linky_api.get_daily_production(usage_point_id, "2020-03-01", "2020-03-05")
-            print("get_daily_production")
-            print(response.content)
-            #input("Press a key")
+        if args.concurrent:
+            import asyncio
+            asyncio.run(fetch_all_concurrently(auth, usage_point_ids))
+        else:
+            customers = CustomerCache(linky_api)
+            for usage_point_id in usage_point_ids:
+                print(usage_point_id)
+                # The four customers endpoints are fetched at once, then memoized; errors are printed
+                for scope, data in customers.profile(usage_point_id).load(return_exceptions=True).items():
+                    print(scope)
+                    print(data)
+                for name, args_ in _metering_calls(usage_point_id):
+                    response = getattr(linky_api, name)(*args_)
+                    print(name)
+                    print(response.content)
 
         linky_client = LinkyClient(auth)
         linky_client.fetch_data()
         data = linky_client.get_data()
         print(data)
 
+        if args.metrics:
+            print(metrics.to_openmetrics())
+
 
     except BaseException as exp:
         print(exp)
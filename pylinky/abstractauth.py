@@ -1,10 +1,18 @@
-from typing import Optional, Union, Callable, Dict
-
-from requests import Response
-from requests_oauthlib import OAuth2Session
-from oauthlib.oauth2 import TokenExpiredError
+import time
+from typing import TYPE_CHECKING, Optional, Union, Callable, Dict, Tuple, Iterable
 from urllib.parse import urlencode
 
+from .metrics import RequestEvent, RequestObserver
+from .ratelimit import RateLimiter, RetryPolicy, CircuitBreaker
+from .tokenmanager import TokenManager, DEFAULT_REFRESH_MARGIN
+from .exceptions import PyLinkyException
+from .tokenstore import DEFAULT_LEASE, TokenStore, default_token_key, refresh_shared, store_token
+
+# requests and oauthlib are only imported once a session is needed
+if TYPE_CHECKING:
+    from requests import Response
+    from requests.adapters import HTTPAdapter
+
 
 AUTHORIZE_URL_SANDBOX           = "https://gw.hml.api.enedis.fr/dataconnect/v1/oauth2/authorize"
 ENDPOINT_TOKEN_URL_SANDBOX      = "https://gw.hml.api.enedis.fr/v1/oauth2/token"
@@ -14,6 +22,22 @@ AUTHORIZE_URL_PROD              = "https://gw.prd.api.enedis.fr/dataconnect/v1/o
 ENDPOINT_TOKEN_URL_PROD         = "https://gw.prd.api.enedis.fr/v1/oauth2/token"
 METERING_DATA_BASE_URL_PROD     = "https://gw.prd.api.enedis.fr"
 
+TOKEN_PATH                      = "/v1/oauth2/token"
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+# (connect, read) timeouts in seconds, load curves can take a while to be generated
+DEFAULT_TIMEOUT = (10, 60)
+
+
+def make_adapter(pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> 'HTTPAdapter':
+    """Build a connection pool that can be shared by several AbstractAuth."""
+    from requests.adapters import HTTPAdapter
+
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+
 class AbstractAuth:
     def __init__(
         self,
@@ -22,13 +46,58 @@ class AbstractAuth:
         client_secret: str = None,
         redirect_url: str = None,
         token_updater: Optional[Callable[[str], None]] = None,
-        sandbox: bool = True
+        sandbox: bool = True,
+        refresh_margin: int = DEFAULT_REFRESH_MARGIN,
+        background_refresh: bool = False,
+        adapter: Optional['HTTPAdapter'] = None,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        timeout: Optional[Union[float, Tuple[float, float]]] = DEFAULT_TIMEOUT,
+        compress: bool = True,
+        keep_alive: bool = True,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        base_url: Optional[str] = None,
+        observers: Iterable[RequestObserver] = (),
+        token_store: Optional[TokenStore] = None,
+        token_key: Optional[str] = None
     ):
+        """adapter lets several instances share one connection pool (see make_adapter),
+        otherwise one is built from pool_connections and pool_maxsize.
+        base_url replaces the Enedis gateway, for tests and benchmarks.
+        Pass the same rate_limiter and circuit_breaker to every instance using one
+        Enedis application so they share its quotas.
+        observers are told about every request and token refresh, see pylinky.metrics.
+        With a token_store shared by several processes, the token is kept under
+        token_key and refreshed by one process at a time, the others pick it up
+        from the store. token_key defaults to client_id and the consent of token
+        (see tokenstore.default_token_key); it is required to load the token
+        from the store when token is not given.
+        """
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_url = redirect_url
         self.token_updater = token_updater
         self.sandbox = sandbox
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.observers = list(observers)
+        self.token_store = token_store
+        self.token_key = token_key
+        # Derived keys follow the token, e.g. when another consent is requested
+        self._derive_token_key = token_key is None and token_store is not None
+        if self._derive_token_key:
+            if token is None:
+                raise PyLinkyException("token_key is required to load the token from token_store")
+            self.token_key = default_token_key(client_id, token)
+        elif token is None and token_store is not None:
+            value, _ = token_store.read(self.token_key)
+            token = value['token'] if value else None
+
+        from requests_oauthlib import OAuth2Session
 
         extra = {"client_id": self.client_id, "client_secret": self.client_secret}
 
@@ -38,6 +107,30 @@ class AbstractAuth:
             token=token,
             token_updater=token_updater,
         )
+        self._owns_adapter = adapter is None
+        if adapter is None:
+            adapter = make_adapter(pool_connections, pool_maxsize)
+        self._oauth.mount("https://", adapter)
+        self._oauth.mount("http://", adapter)
+
+        self._base_url = METERING_DATA_BASE_URL_PROD
+        self._token_url = ENDPOINT_TOKEN_URL_PROD
+        if (self.sandbox):
+            self._base_url = METERING_DATA_BASE_URL_SANDBOX
+            self._token_url = ENDPOINT_TOKEN_URL_SANDBOX
+        if base_url is not None:
+            self._base_url = base_url
+            self._token_url = base_url + TOKEN_PATH
+        # This header is required by v3/customers, v4/metering data is ok with the default */*
+        self._headers = {'Accept': "application/json"}
+        # requests asks for gzip by default, identity turns it off
+        self._headers['Accept-Encoding'] = "gzip, deflate" if compress else "identity"
+        if not keep_alive:
+            self._headers['Connection'] = "close"
+
+        self._token_manager = TokenManager(lambda: self._oauth.token, self._refresh_session_token, refresh_margin)
+        if background_refresh:
+            self._token_manager.start()
 
     def authorization_url(self, duration: str="", test_customer: str=""):
         """test state will be appended to state for sandbox testing, it can be 0 to 9"""
@@ -51,52 +144,130 @@ class AbstractAuth:
 
     def refresh_tokens(self) -> Dict[str, Union[str, int]]:
         """Refresh and return new tokens."""
-        url = ENDPOINT_TOKEN_URL_PROD
-        if (self.sandbox):
-            url = ENDPOINT_TOKEN_URL_SANDBOX
+        url = self._token_url
         if self.redirect_url is not None:
             url = url + "?" + urlencode({'redirect_uri': self.redirect_url})
-        token = self._oauth.refresh_token(url, include_client_id=True, client_id=self.client_id, client_secret=self.client_secret, refresh_token=self._oauth.token['refresh_token'])
+        token = self._oauth.refresh_token(url, include_client_id=True, client_id=self.client_id, client_secret=self.client_secret, refresh_token=self._oauth.token['refresh_token'], timeout=self.timeout)
 
         if self.token_updater is not None:
             self.token_updater(token)
 
         return token
 
+    def _refresh_session_token(self):
+        if self.token_store is None:
+            self._oauth.token = self.refresh_tokens()
+        else:
+            self._oauth.token = refresh_shared(self.token_store, self.token_key, self._oauth.token,
+                                               self.refresh_tokens, self._refresh_lease())
+        for observer in self.observers:
+            observer.on_refresh()
+
+    def _refresh_lease(self):
+        """Seconds the refresh of a shared token may take, beyond the request timeouts."""
+        timeout = self.timeout
+        if isinstance(timeout, tuple):
+            timeout = sum(timeout)
+        return DEFAULT_LEASE if timeout is None else max(DEFAULT_LEASE, 2 * timeout)
+
+    def add_observer(self, observer: RequestObserver):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer: RequestObserver):
+        self.observers.remove(observer)
+
     def request_tokens(self, code) -> Dict[str, Union[str, int]]:
         """return new tokens."""
-        url = ENDPOINT_TOKEN_URL_PROD
-        if (self.sandbox):
-            url = ENDPOINT_TOKEN_URL_SANDBOX
+        url = self._token_url
         if self.redirect_url is not None:
             url = url + "?" + urlencode({'redirect_uri': self.redirect_url})
-        token = self._oauth.fetch_token(url, include_client_id=True, client_id=self.client_id, client_secret=self.client_secret, code=code)
+        token = self._oauth.fetch_token(url, include_client_id=True, client_id=self.client_id, client_secret=self.client_secret, code=code, timeout=self.timeout)
+        self._token_manager.token_changed()
+        if self.token_store is not None:
+            if self._derive_token_key:
+                self.token_key = default_token_key(self.client_id, token)
+            store_token(self.token_store, self.token_key, token)
 
         if self.token_updater is not None:
             self.token_updater(token)
         return token
 
-    def request(self, path: str, arguments: Dict[str, str]) -> Response:
+    def request(self, path: str, arguments: Dict[str, str], stream: bool = False) -> 'Response':
         """Make a request.
         We don't use the built-in token refresh mechanism of OAuth2 session because
         we want to allow overriding the token refresh logic.
+        Calls wait for the rate limiter, 429/5xx answers and connection errors are
+        retried with backoff, and calls fail fast while the circuit breaker is open.
+        With stream, the body is left unread for Response.iter_content.
         """
-        url = METERING_DATA_BASE_URL_PROD
-        if (self.sandbox):
-            url = METERING_DATA_BASE_URL_SANDBOX
-        url = url + path
-        # This header is required by v3/customers, v4/metering data is ok with the default */*
-        headers = {'Accept': "application/json"}
+        from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+        url = self._base_url + path
+        started = time.monotonic()
+        attempt = 0
+        response = None
+        error = None
         try:
-            response = self._oauth.request("GET", url, params=arguments, headers=headers)
+            while True:
+                self.circuit_breaker.check()
+                self.rate_limiter.acquire()
+                try:
+                    response = self._send(url, arguments, stream)
+                except (RequestsConnectionError, Timeout):
+                    if not self.retry_policy.should_retry(attempt):
+                        raise
+                    time.sleep(self.retry_policy.delay(attempt))
+                    attempt += 1
+                    continue
+
+                if not self.retry_policy.should_retry(attempt, response.status_code):
+                    # Once per call, retries of one failing meter don't open the circuit by themselves
+                    self.circuit_breaker.record(response.status_code)
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+                response = None
+                time.sleep(self.retry_policy.delay(attempt, retry_after))
+                attempt += 1
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.observers:
+                self._notify(path, arguments, time.monotonic() - started, response, attempt, error, stream)
+
+    def _notify(self, path, arguments, duration, response, retries, error, stream):
+        status_code = None
+        size = 0
+        if response is not None:
+            status_code = response.status_code
+            length = response.headers.get('Content-Length')
+            if length is not None and length.isdigit():
+                size = int(length)
+            elif not stream:
+                size = len(response.content)
+        event = RequestEvent(path, arguments.get('usage_point_id'), status_code, duration, size, retries, error)
+        for observer in self.observers:
+            observer.on_request(event)
+
+    def _send(self, url: str, arguments: Dict[str, str], stream: bool = False) -> 'Response':
+        from oauthlib.oauth2 import TokenExpiredError
+
+        # Refresh ahead of expiry; concurrent refreshes of one token are merged
+        generation = self._token_manager.ensure_valid()
+        try:
+            response = self._oauth.request("GET", url, params=arguments, headers=self._headers,
+                                           timeout=self.timeout, stream=stream)
             if (response.status_code == 403):
-                self._oauth.token = self.refresh_tokens()
+                response.close()
+                self._token_manager.refresh(generation)
             else:
                 return response
         except TokenExpiredError:
-            self._oauth.token = self.refresh_tokens()
+            self._token_manager.refresh(generation)
 
-        return self._oauth.request("GET", url, params=arguments, headers=headers)
+        return self._oauth.request("GET", url, params=arguments, headers=self._headers, timeout=self.timeout,
+                                   stream=stream)
 
     def get_usage_point_ids(self):
         if not self._oauth.token or not self._oauth.token.get("usage_points_id"):
@@ -104,6 +275,10 @@ class AbstractAuth:
         return self._oauth.token['usage_points_id'].split(",")
 
     def close(self):
+        self._token_manager.stop()
+        if self._oauth and not self._owns_adapter:
+            # Leave a shared connection pool open for the other users
+            self._oauth.adapters.clear()
         if self._oauth:
             self._oauth.close()
         self._oauth = None
@@ -0,0 +1,234 @@
+import asyncio
+import time
+from typing import Optional, Union, Callable, Dict, Iterable
+
+import aiohttp
+from oauthlib.common import generate_token
+from urllib.parse import urlencode
+
+from .abstractauth import (AUTHORIZE_URL_SANDBOX, ENDPOINT_TOKEN_URL_SANDBOX, METERING_DATA_BASE_URL_SANDBOX,
+                           AUTHORIZE_URL_PROD, ENDPOINT_TOKEN_URL_PROD, METERING_DATA_BASE_URL_PROD, TOKEN_PATH)
+from .metrics import RequestEvent, RequestObserver
+from .ratelimit import RateLimiter, RetryPolicy, CircuitBreaker
+
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_CONNECTION_LIMIT = 100
+# Total and connect timeouts in seconds
+DEFAULT_TIMEOUT = 90
+DEFAULT_CONNECT_TIMEOUT = 10
+
+
+class AsyncAbstractAuth:
+    """asyncio counterpart of AbstractAuth, built on aiohttp.
+
+    All requests go through one shared aiohttp.ClientSession (connection pool)
+    and at most max_concurrency of them are in flight at the same time.
+    base_url replaces the Enedis gateway, for tests and benchmarks.
+    """
+
+    def __init__(
+        self,
+        token: Optional[Dict[str, str]] = None,
+        client_id: str = None,
+        client_secret: str = None,
+        redirect_url: str = None,
+        token_updater: Optional[Callable[[str], None]] = None,
+        sandbox: bool = True,
+        websession: Optional[aiohttp.ClientSession] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        base_url: Optional[str] = None,
+        observers: Iterable[RequestObserver] = ()
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_url = redirect_url
+        self.token_updater = token_updater
+        self.sandbox = sandbox
+        self.token = token or {}
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.observers = list(observers)
+
+        self._base_url = METERING_DATA_BASE_URL_PROD
+        self._token_base_url = ENDPOINT_TOKEN_URL_PROD
+        if (self.sandbox):
+            self._base_url = METERING_DATA_BASE_URL_SANDBOX
+            self._token_base_url = ENDPOINT_TOKEN_URL_SANDBOX
+        if base_url is not None:
+            self._base_url = base_url
+            self._token_base_url = base_url + TOKEN_PATH
+
+        self._websession = websession
+        self._owns_websession = websession is None
+        self._connection_limit = connection_limit
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._semaphore = None
+        self._refresh_lock = None
+
+    @property
+    def websession(self) -> aiohttp.ClientSession:
+        """Shared session, created lazily so it binds to the running loop."""
+        if self._websession is None:
+            connector = aiohttp.TCPConnector(limit=self._connection_limit)
+            self._websession = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+        return self._websession
+
+    def _bind_loop(self):
+        """Create the semaphore and refresh lock in the running loop.
+
+        Before Python 3.10 they bind to the loop current at creation, which is
+        not the one asyncio.run starts; a new loop gets new ones.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._refresh_lock = asyncio.Lock()
+
+    def _token_url(self):
+        url = self._token_base_url
+        if self.redirect_url is not None:
+            url = url + "?" + urlencode({'redirect_uri': self.redirect_url})
+        return url
+
+    def authorization_url(self, duration: str="", test_customer: str=""):
+        """test state will be appended to state for sandbox testing, it can be 0 to 9"""
+        url = AUTHORIZE_URL_PROD
+        if (self.sandbox):
+            url = AUTHORIZE_URL_SANDBOX
+        state = generate_token()
+        if test_customer:
+            state = state + test_customer
+        params = {'response_type': 'code', 'client_id': self.client_id, 'state': state, 'duration': duration}
+        return url + "?" + urlencode(params), state
+
+    async def _fetch_token(self, data: Dict[str, str]) -> Dict[str, Union[str, int]]:
+        data = dict(data, client_id=self.client_id, client_secret=self.client_secret)
+        async with self.websession.post(self._token_url(), data=data) as response:
+            response.raise_for_status()
+            token = await response.json(content_type=None)
+
+        if 'expires_in' in token:
+            token['expires_at'] = time.time() + int(token['expires_in'])
+        self.token = token
+
+        if self.token_updater is not None:
+            self.token_updater(token)
+        return token
+
+    async def refresh_tokens(self) -> Dict[str, Union[str, int]]:
+        """Refresh and return new tokens."""
+        return await self._fetch_token({'grant_type': 'refresh_token',
+                                        'refresh_token': self.token['refresh_token']})
+
+    async def request_tokens(self, code) -> Dict[str, Union[str, int]]:
+        """return new tokens."""
+        return await self._fetch_token({'grant_type': 'authorization_code', 'code': code})
+
+    def _token_expired(self):
+        expires_at = self.token.get('expires_at')
+        return expires_at is not None and float(expires_at) < time.time()
+
+    async def _refresh_if(self, stale_token):
+        """Refresh unless another task already did it while we waited for the lock."""
+        async with self._refresh_lock:
+            if self.token is stale_token:
+                await self.refresh_tokens()
+                for observer in self.observers:
+                    observer.on_refresh()
+
+    def add_observer(self, observer: RequestObserver):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer: RequestObserver):
+        self.observers.remove(observer)
+
+    async def request(self, path: str, arguments: Dict[str, str]) -> aiohttp.ClientResponse:
+        """Make a request.
+        The body is read before returning so the response can be used once the
+        connection has been released to the pool. Rate limiting, retries and the
+        circuit breaker work as in AbstractAuth.request.
+        """
+        url = self._base_url + path
+        self._bind_loop()
+
+        started = time.monotonic()
+        attempt = 0
+        response = None
+        error = None
+        try:
+            while True:
+                self.circuit_breaker.check()
+                await asyncio.sleep(self.rate_limiter.reserve())
+                try:
+                    async with self._semaphore:
+                        response = await self._send(url, arguments)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if not self.retry_policy.should_retry(attempt):
+                        raise
+                    await asyncio.sleep(self.retry_policy.delay(attempt))
+                    attempt += 1
+                    continue
+
+                if not self.retry_policy.should_retry(attempt, response.status):
+                    # Once per call, retries of one failing meter don't open the circuit by themselves
+                    self.circuit_breaker.record(response.status)
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                response = None
+                await asyncio.sleep(self.retry_policy.delay(attempt, retry_after))
+                attempt += 1
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.observers:
+                self._notify(path, arguments, time.monotonic() - started, response, attempt, error)
+
+    def _notify(self, path, arguments, duration, response, retries, error):
+        status_code = None
+        size = 0
+        if response is not None:
+            status_code = response.status
+            size = response.content_length or 0
+        event = RequestEvent(path, arguments.get('usage_point_id'), status_code, duration, size, retries, error)
+        for observer in self.observers:
+            observer.on_request(event)
+
+    async def _send(self, url, arguments):
+        token = self.token
+        if self._token_expired():
+            await self._refresh_if(token)
+
+        response = await self._get(url, arguments)
+        if (response.status == 403):
+            await self._refresh_if(token)
+            response = await self._get(url, arguments)
+        return response
+
+    async def _get(self, url, arguments):
+        # This header is required by v3/customers, v4/metering data is ok with the default */*
+        headers = {'Accept': "application/json",
+                   'Authorization': "Bearer " + self.token.get('access_token', '')}
+        async with self.websession.get(url, params=arguments, headers=headers) as response:
+            await response.read()
+            return response
+
+    def get_usage_point_ids(self):
+        if not self.token or not self.token.get("usage_points_id"):
+            return []
+        return self.token['usage_points_id'].split(",")
+
+    async def close(self):
+        if self._websession is not None and self._owns_websession:
+            await self._websession.close()
+        self._websession = None
@@ -0,0 +1,54 @@
+import asyncio
+
+import aiohttp
+
+from .exceptions import PyLinkyAccessException
+
+from .aioabstractauth import AsyncAbstractAuth
+from .aiolinkyapi import AsyncLinkyAPI
+from .client import BaseLinkyClient, HOURLY, DAILY, MONTHLY, YEARLY, _MAP, _RESSOURCE
+
+
+class AsyncLinkyClient(BaseLinkyClient):
+    """Client fetching all periods concurrently over AsyncLinkyAPI.
+
+    Stored periods are formatted as with LinkyClient (format_data, get_data).
+    """
+
+    def __init__(self, auth: AsyncAbstractAuth, authorize_duration="P1Y"):
+        """Initialize the client object."""
+        BaseLinkyClient.__init__(self, AsyncLinkyAPI(auth, authorize_duration))
+
+    async def _async_get_data(self, p_p_resource_id, start_date=None, end_date=None, usage_point_id=None):
+        """Get data."""
+
+        try:
+            if usage_point_id is None:
+                usage_point_id = self._default_usage_point_id()
+            return await self._api.get_metering_data_range(self._scope(p_p_resource_id), usage_point_id,
+                                                           start_date, end_date)
+        except (OSError, aiohttp.ClientError) as e:
+            raise PyLinkyAccessException("Could not access enedis.fr: " + str(e))
+
+    async def async_get_data_per_period(self, period_type=HOURLY, start=None, end=None):
+        start, end = self._get_period_window(period_type, start, end)
+        data = await self._async_get_data(_MAP[_RESSOURCE][period_type], start, end)
+        return self._store_data(period_type, data)
+
+    async def async_fetch_data(self, derive_aggregates=False):
+        """Get the latest data from Enedis, all periods at the same time.
+
+        derive_aggregates works as in LinkyClient.fetch_data.
+        """
+        if not derive_aggregates:
+            await asyncio.gather(*[self.async_get_data_per_period(t) for t in [HOURLY, DAILY, MONTHLY, YEARLY]])
+            return
+
+        windows, (start, end) = self._aggregate_windows()
+        _, data = await asyncio.gather(self.async_get_data_per_period(HOURLY),
+                                       self._async_get_data(_MAP[_RESSOURCE][DAILY], start, end))
+        self._store_aggregates(data, windows)
+
+    async def close_session(self):
+        """Close current session."""
+        await self._api.close_session()
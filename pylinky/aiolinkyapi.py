@@ -0,0 +1,82 @@
+import asyncio
+
+from .aioabstractauth import AsyncAbstractAuth
+from .linkyapi import SCOPE, MAX_DAYS, split_range, merge_meter_readings, parse_meter_reading
+
+
+class AsyncLinkyAPI(object):
+    """asyncio counterpart of LinkyAPI, every call is a coroutine."""
+
+    def __init__(self, auth: AsyncAbstractAuth, authorize_duration="P1Y", ):
+        """Initialize the client object."""
+        self.authorize_duration = authorize_duration
+        self._auth = auth
+
+    def get_authorisation_url(self, test_customer=""):
+        auth_url = self._auth.authorization_url(self.authorize_duration, test_customer=test_customer)
+        return auth_url[0]
+
+    async def request_tokens(self, code):
+        await self._auth.request_tokens(code)
+
+    def get_usage_point_ids(self):
+        return self._auth.get_usage_point_ids()
+
+    async def get_consumption_load_curve(self, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return await self._auth.request(SCOPE['CONSUMPTION_LOAD_CURVE'], argument_dictionnary)
+
+    async def get_production_load_curve(self, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return await self._auth.request(SCOPE['PRODUCTION_LOAD_CURVE'], argument_dictionnary)
+
+    async def get_daily_consumption_max_power(self, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return await self._auth.request(SCOPE['DAILY_CONSUMPTION_MAX_POWER'], argument_dictionnary)
+
+    async def get_daily_consumption(self, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return await self._auth.request(SCOPE['DAILY_CONSUMPTION'], argument_dictionnary)
+
+    async def get_daily_production(self, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return await self._auth.request(SCOPE['DAILY_PRODUCTION'], argument_dictionnary)
+
+    async def get_metering_data(self, scope, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return await self._auth.request(SCOPE[scope], argument_dictionnary)
+
+    async def get_metering_data_range(self, scope, usage_point_id, start, end):
+        """Fetch and decode any window of a metering endpoint, chunks are fetched concurrently."""
+        windows = [(start, end)]
+        if start is not None and end is not None:
+            windows = split_range(start, end, MAX_DAYS[scope]) or windows
+
+        async def fetch(window):
+            raw_res = await self.get_metering_data(scope, usage_point_id, window[0], window[1])
+            return parse_meter_reading(raw_res.status, await raw_res.text())
+
+        meter_readings = await asyncio.gather(*[fetch(window) for window in windows])
+        if len(meter_readings) == 1:
+            return meter_readings[0]
+        return merge_meter_readings(meter_readings)
+
+    async def get_customer_identity(self, usage_point_id):
+        argument_dictionnary = {'usage_point_id': usage_point_id}
+        return await self._auth.request(SCOPE['IDENTITY'], argument_dictionnary)
+
+    async def get_customer_contact_data(self, usage_point_id):
+        argument_dictionnary = {'usage_point_id': usage_point_id}
+        return await self._auth.request(SCOPE['CONTACT_DATA'], argument_dictionnary)
+
+    async def get_customer_usage_points_contracts(self, usage_point_id):
+        argument_dictionnary = {'usage_point_id': usage_point_id}
+        return await self._auth.request(SCOPE['CONTRACTS'], argument_dictionnary)
+
+    async def get_customer_usage_points_addresses(self, usage_point_id):
+        argument_dictionnary = {'usage_point_id': usage_point_id}
+        return await self._auth.request(SCOPE['ADDRESSES'], argument_dictionnary)
+
+    async def close_session(self):
+        """Close current session."""
+        await self._auth.close()
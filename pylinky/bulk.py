@@ -0,0 +1,122 @@
+"""Bulk decoding and aggregation of meter readings over a process pool.
+
+For backfills of many meters over many years, decoding JSON and bucketing
+readings is CPU bound. Raw response bodies are copied once into a shared
+memory block the workers read from, or read by the workers from files;
+workers only send back the bucket timestamps and totals, as raw int64 bytes.
+"""
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from .client import _MAP, _FORMAT
+from .linkyapi import parse_meter_reading
+from .series import ReadingSeries, numpy, reduction_for
+
+# Items sent to a worker at once
+DEFAULT_CHUNKSIZE = 16
+
+# Shared memory blocks attached by this worker process, by name
+_attached = {}
+
+
+def _int64_bytes(values):
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.astype(numpy.int64).tobytes()
+    return array('q', values).tobytes()
+
+
+def _from_int64_bytes(data):
+    if numpy is not None:
+        return numpy.frombuffer(data, dtype=numpy.int64)
+    values = array('q')
+    values.frombytes(data)
+    return values
+
+
+def _aggregate_body(body, reduction):
+    """Decode a response body and sum its readings per bucket."""
+    meter_reading = parse_meter_reading(200, body.decode("utf-8") if isinstance(body, bytes) else body)
+    buckets, sums = ReadingSeries.from_interval_reading(meter_reading.get('interval_reading', [])).group(reduction)
+    return meter_reading.get('usage_point_id'), _int64_bytes(buckets), _int64_bytes(sums)
+
+
+def _aggregate_shared(task):
+    name, offset, length, reduction = task
+    block = _attached.get(name)
+    if block is None:
+        block = _attached[name] = shared_memory.SharedMemory(name=name)
+    return _aggregate_body(bytes(block.buf[offset:offset + length]), reduction)
+
+
+def _aggregate_file(task):
+    path, reduction = task
+    with open(path, "rb") as f:
+        return _aggregate_body(f.read(), reduction)
+
+
+class BulkResult(object):
+    """Readings of one meter reading summed per time_format bucket."""
+
+    __slots__ = ('usage_point_id', 'time_format', 'series')
+
+    def __init__(self, usage_point_id, time_format, buckets, sums):
+        self.usage_point_id = usage_point_id
+        self.time_format = time_format
+        self.series = ReadingSeries(_from_int64_bytes(buckets), _from_int64_bytes(sums))
+
+    def aggregate(self):
+        """(label, total) pairs."""
+        return self.series.aggregate(self.time_format)
+
+    def view(self):
+        """[{"time": label, "conso": total}], like LinkyClient.format_data."""
+        return [{"time": key, "conso": conso} for key, conso in self.aggregate()]
+
+    def __repr__(self):
+        return "BulkResult({!r}, {!r}, buckets={})".format(self.usage_point_id, self.time_format, len(self.series))
+
+
+def _run(func, tasks, processes, chunksize):
+    if processes == 1 or len(tasks) < 2:
+        return list(map(func, tasks))
+    with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as executor:
+        return list(executor.map(func, tasks, chunksize=chunksize))
+
+
+def aggregate_bodies(bodies, period_type, time_format=None, processes=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Decode and bucket raw metering response bodies (str or bytes) in parallel.
+
+    time_format defaults to the format of period_type in _MAP; buckets are
+    as coarse as it allows. Returns a BulkResult per body, in order.
+    """
+    time_format = time_format or _MAP[_FORMAT][period_type]
+    reduction = reduction_for(time_format)
+    bodies = [body.encode("utf-8") if isinstance(body, str) else body for body in bodies]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(bodies) < 2:
+        outputs = [_aggregate_body(body, reduction) for body in bodies]
+        return [BulkResult(upid, time_format, buckets, sums) for upid, buckets, sums in outputs]
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, sum(len(body) for body in bodies)))
+    try:
+        tasks = []
+        offset = 0
+        for body in bodies:
+            block.buf[offset:offset + len(body)] = body
+            tasks.append((block.name, offset, len(body), reduction))
+            offset += len(body)
+        outputs = _run(_aggregate_shared, tasks, processes, chunksize)
+    finally:
+        block.close()
+        block.unlink()
+    return [BulkResult(upid, time_format, buckets, sums) for upid, buckets, sums in outputs]
+
+
+def aggregate_files(paths, period_type, time_format=None, processes=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Same as aggregate_bodies, for response bodies saved to files; workers read the files."""
+    time_format = time_format or _MAP[_FORMAT][period_type]
+    tasks = [(os.fspath(path), reduction_for(time_format)) for path in paths]
+    outputs = _run(_aggregate_file, tasks, processes or os.cpu_count() or 1, chunksize)
+    return [BulkResult(upid, time_format, buckets, sums) for upid, buckets, sums in outputs]
@@ -0,0 +1,177 @@
+import datetime
+import json
+import threading
+import time
+
+DEFAULT_MUTABLE_TTL = 15 * 60
+DEFAULT_MAX_READINGS = 5000000
+
+# Today and yesterday may still be completed or corrected by Enedis
+MUTABLE_DAYS = 2
+
+_DATE_FORMAT = "%Y-%m-%d"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    usage_point_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    day TEXT NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (usage_point_id, scope, day)
+);
+CREATE TABLE IF NOT EXISTS readings (
+    usage_point_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    day TEXT NOT NULL,
+    date TEXT NOT NULL,
+    point TEXT NOT NULL,
+    PRIMARY KEY (usage_point_id, scope, date)
+);
+CREATE INDEX IF NOT EXISTS readings_day ON readings (usage_point_id, scope, day);
+CREATE TABLE IF NOT EXISTS meta (
+    usage_point_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    meter_reading TEXT NOT NULL,
+    PRIMARY KEY (usage_point_id, scope)
+);
+"""
+
+
+def day_range(start, end):
+    """Return the "YYYY-MM-DD" days of [start, end)."""
+    start = datetime.datetime.strptime(start, _DATE_FORMAT).date()
+    end = datetime.datetime.strptime(end, _DATE_FORMAT).date()
+    return [(start + datetime.timedelta(days=i)).strftime(_DATE_FORMAT) for i in range((end - start).days)]
+
+
+def group_days(days):
+    """Group sorted "YYYY-MM-DD" days into contiguous [start, end) windows."""
+    windows = []
+    for day in days:
+        date = datetime.datetime.strptime(day, _DATE_FORMAT).date()
+        next_day = (date + datetime.timedelta(days=1)).strftime(_DATE_FORMAT)
+        if windows and windows[-1][1] == day:
+            windows[-1][1] = next_day
+        else:
+            windows.append([day, next_day])
+    return [tuple(window) for window in windows]
+
+
+def reading_day(date):
+    """Day a reading belongs to.
+
+    Load curve readings are stamped with the end of their interval, so a
+    reading at midnight belongs to the previous day.
+    """
+    if len(date) <= 10:
+        return date
+    stamp = datetime.datetime.strptime(date, "%Y-%m-%d %H:%M:%S") - datetime.timedelta(seconds=1)
+    return stamp.strftime(_DATE_FORMAT)
+
+
+class MeteringCache(object):
+    """SQLite cache of interval readings per usage point, endpoint and day.
+
+    Past days never change once published and are kept until ttl expires
+    (forever by default); today and yesterday, and days Enedis returned no
+    readings for (maybe not published yet), only live for mutable_ttl.
+    When more than max_readings readings are stored the least recently
+    used days are evicted.
+    """
+
+    def __init__(self, path=":memory:", ttl=None, mutable_ttl=DEFAULT_MUTABLE_TTL,
+                 max_readings=DEFAULT_MAX_READINGS):
+        self.ttl = ttl
+        self.mutable_ttl = mutable_ttl
+        self.max_readings = max_readings
+        self._lock = threading.Lock()
+        import sqlite3
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def _expires_at(self, day, now, has_readings=True):
+        first_mutable = datetime.date.today() - datetime.timedelta(days=MUTABLE_DAYS - 1)
+        if not has_readings or day >= first_mutable.strftime(_DATE_FORMAT):
+            return now + self.mutable_ttl
+        if self.ttl is None:
+            return None
+        return now + self.ttl
+
+    def missing_days(self, usage_point_id, scope, days):
+        """Return the days that are not cached or have expired."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, expires_at FROM days WHERE usage_point_id = ? AND scope = ? AND day >= ? AND day <= ?",
+                (usage_point_id, scope, min(days), max(days))).fetchall() if days else []
+        fresh = set(day for day, expires_at in rows if expires_at is None or expires_at > now)
+        return [day for day in days if day not in fresh]
+
+    def put(self, usage_point_id, scope, meter_reading, start, end):
+        """Store the readings of a meter reading fetched for [start, end)."""
+        now = time.time()
+        days = day_range(start, end)
+        points = [p for p in meter_reading.get('interval_reading', []) if start <= reading_day(p['date']) < end]
+        meta = dict((k, v) for k, v in meter_reading.items() if k not in ('interval_reading', 'start', 'end'))
+        filled = set(reading_day(p['date']) for p in points)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM readings WHERE usage_point_id = ? AND scope = ? AND day >= ? AND day < ?",
+                (usage_point_id, scope, start, end))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO readings VALUES (?, ?, ?, ?, ?)",
+                [(usage_point_id, scope, reading_day(p['date']), p['date'], json.dumps(p)) for p in points])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?, ?)",
+                [(usage_point_id, scope, day, self._expires_at(day, now, day in filled), now) for day in days])
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)",
+                               (usage_point_id, scope, json.dumps(meta)))
+        self._evict()
+
+    def get(self, usage_point_id, scope, start, end):
+        """Return the cached meter reading of [start, end)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE days SET accessed_at = ? WHERE usage_point_id = ? AND scope = ? AND day >= ? AND day < ?",
+                (time.time(), usage_point_id, scope, start, end))
+            meta = self._conn.execute("SELECT meter_reading FROM meta WHERE usage_point_id = ? AND scope = ?",
+                                      (usage_point_id, scope)).fetchone()
+            rows = self._conn.execute(
+                "SELECT point FROM readings WHERE usage_point_id = ? AND scope = ? AND day >= ? AND day < ? "
+                "ORDER BY date", (usage_point_id, scope, start, end)).fetchall()
+
+        meter_reading = json.loads(meta[0]) if meta else {'usage_point_id': usage_point_id}
+        meter_reading['start'] = start
+        meter_reading['end'] = end
+        meter_reading['interval_reading'] = [json.loads(row[0]) for row in rows]
+        return meter_reading
+
+    def _evict(self):
+        with self._lock, self._conn:
+            count = self._conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+            if count <= self.max_readings:
+                return
+            victims = self._conn.execute(
+                "SELECT d.usage_point_id, d.scope, d.day, COUNT(r.date) FROM days d "
+                "LEFT JOIN readings r ON r.usage_point_id = d.usage_point_id AND r.scope = d.scope AND r.day = d.day "
+                "GROUP BY d.usage_point_id, d.scope, d.day ORDER BY d.accessed_at").fetchall()
+            for usage_point_id, scope, day, size in victims:
+                if count <= self.max_readings:
+                    break
+                self._conn.execute("DELETE FROM readings WHERE usage_point_id = ? AND scope = ? AND day = ?",
+                                   (usage_point_id, scope, day))
+                self._conn.execute("DELETE FROM days WHERE usage_point_id = ? AND scope = ? AND day = ?",
+                                   (usage_point_id, scope, day))
+                count -= size
+
+    def clear(self):
+        with self._lock, self._conn:
+            for table in ('days', 'readings', 'meta'):
+                self._conn.execute("DELETE FROM " + table)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,16 +1,18 @@
 import datetime
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, List, Optional
 
-import requests
-import simplejson
-from dateutil.relativedelta import relativedelta
-
-from .exceptions import (PyLinkyAccessException, PyLinkyEnedisException,
-                         PyLinkyException, PyLinkyMaintenanceException,
-                         PyLinkyWrongLoginException)
+from .exceptions import PyLinkyAccessException, PyLinkyException
 
 from .abstractauth import AbstractAuth
-from .linkyapi import LinkyAPI
+from .cache import MeteringCache
+from .customer import CustomerCache, CustomerProfile
+from .sync import SyncState
+from .linkyapi import DEFAULT_MAX_WORKERS, DEFAULT_RESPONSE_TTL, LinkyAPI
+
+if TYPE_CHECKING:
+    from .export import Sink
+    from .series import MeterReading
 
 HOURLY = "hourly"
 DAILY = "daily"
@@ -18,6 +20,9 @@ MONTHLY = "monthly"
 YEARLY = "yearly"
 
 
+SYNC_INITIAL_DAYS = 7
+DEFAULT_BATCH_WORKERS = 8
+
 _DELTA = 'delta'
 _FORMAT = 'format'
 _RESSOURCE = 'ressource'
@@ -29,80 +34,98 @@ _MAP = {
     _DURATION: {HOURLY: 24, DAILY: 30, MONTHLY: 12, YEARLY: 3}
 }
 
-class LinkyClient(object):
+class MeterResult(object):
+    """Outcome of a batch fetch for one usage point."""
+
+    def __init__(self, usage_point_id):
+        self.usage_point_id = usage_point_id
+        # period type -> meter reading
+        self.data = {}
+        # period type -> exception raised while fetching it
+        self.errors = {}
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __repr__(self):
+        return "MeterResult({!r}, periods={}, errors={})".format(
+            self.usage_point_id, sorted(self.data), dict((k, str(v)) for k, v in self.errors.items()))
+
+
+class BaseLinkyClient(object):
+    """Periods stored by a client and their formatting, whatever the API calls are made with.
+
+    Subclasses set _api and fetch the data.
+    """
 
     PERIOD_DAILY = DAILY
     PERIOD_MONTHLY = MONTHLY
     PERIOD_YEARLY = YEARLY
     PERIOD_HOURLY = HOURLY
 
-    def __init__(self, auth: AbstractAuth, authorize_duration="P1Y"):
-        """Initialize the client object."""
-        self._api = LinkyAPI(auth, authorize_duration)
+    def __init__(self, api):
+        self._api = api
         self._data = {}
+        # period type -> MeterReading of the data stored
+        self._readings = {}
 
-    def _get_data(self, p_p_resource_id, start_date=None, end_date=None):
-        """Get data."""
-
-        try:
-            upids = self._api.get_usage_point_ids()
-            if not upids:
-                raise PyLinkyException("No usage point")
-            upid = upids[0]
-            if p_p_resource_id == 'urlCdcHeure':
-                raw_res = self._api.get_consumption_load_curve(upids, start_date, end_date)
-            else:
-                raw_res = self._api.get_daily_consumption(upids, start_date, end_date)
-        except OSError as e:
-            raise PyLinkyAccessException("Could not access enedis.fr: " + str(e))
+    def get_usage_point_ids(self):
+        """Usage points the token gives access to."""
+        return self._api.get_usage_point_ids()
 
-        if 404 == raw_res.status_code:
-            raise PyLinkyException("No data")
+    def _default_usage_point_id(self):
+        upids = self.get_usage_point_ids()
+        if not upids:
+            raise PyLinkyException("No usage point")
+        return upids[0]
 
-        if 500 == raw_res.status_code:
-            raise PyLinkyMaintenanceException("Site in maintenance")
-
-        try:
-            json_output = raw_res.json()
-        except (OSError, json.decoder.JSONDecodeError, simplejson.errors.JSONDecodeError) as e:
-            raise PyLinkyException("Impossible to decode response: " + str(e) + "\nResponse was: " + str(raw_res.text))
+    @staticmethod
+    def _scope(p_p_resource_id):
+        """Metering endpoint of a resource of _MAP."""
+        if p_p_resource_id == 'urlCdcHeure':
+            return 'CONSUMPTION_LOAD_CURVE'
+        return 'DAILY_CONSUMPTION'
 
-        if json_output.get('error'):
-            description = json_output.get('error_description')
-            description = json_output['error'] if description is None else description
-            raise PyLinkyEnedisException("Enedis.fr answered with an error: " + description)
+    def _get_reading(self, data):
+        """MeterReading of data, the stored one when data is the stored period."""
+        from .series import MeterReading
 
-        return json_output['meter_reading']
+        period_type = data['period_type']
+        reading = self._readings.get(period_type)
+        if reading is not None and reading.raw is data:
+            return reading
+        return MeterReading(data, period_type)
 
-    def format_data(self, data, time_format=None):
-        result = []
+    def format_data(self, data, time_format=None, period_type=None, empty_buckets=False):
+        """Sum readings per time_format label.
 
+        data is a meter reading, or an iterable of (epoch timestamp, value)
+        pairs such as stream_data yields; period_type gives the default
+        time_format of the latter. Views of stored periods are computed once
+        per fetch and shared, don't modify them. empty_buckets lists the
+        buckets of a meter reading without any reading, see MeterReading.view.
+        """
         # Prevent from non existing data yet
         if not data:
             return []
 
-        period_type = data['period_type']
+        if isinstance(data, dict):
+            reading = self._get_reading(data)
+            return reading.view(time_format or _MAP[_FORMAT][reading.period_type], empty_buckets)
+
+        from .series import ReadingSeries
+        series = ReadingSeries.from_pairs(data)
         if time_format is None:
             time_format = _MAP[_FORMAT][period_type]
-        format_data = _MAP[_DELTA][period_type]
-
-        in_format_date = "%Y-%m-%d"
-        if format_data == 'hours':
-            in_format_date = "%Y-%m-%d %H:%M:%S"
 
-        dicResult = dict()
-        for p in data['interval_reading']:
-            key = datetime.datetime.strptime(p['date'], in_format_date).strftime(time_format)
-            dicResult[key] = dicResult.get(key, 0) + int(p['value'])
+        # Readings are bucketed on timestamps, labels are only formatted once per bucket
+        return [{"time": key, "conso": conso} for key, conso in series.aggregate(time_format)]
 
-        # Generate data
-        for key in dicResult:
-            result.append({"time": key,
-                           "conso": dicResult[key]})
+    def _get_period_window(self, period_type=HOURLY, start=None, end=None):
+        """Return the (start, end) strings to request for a period type."""
+        from dateutil.relativedelta import relativedelta
 
-        return result
-
-    def get_data_per_period(self, period_type=HOURLY, start=None, end=None):
         today = datetime.date.today()
         if start is None:
             kwargs = {_MAP[_DELTA][period_type]: _MAP[_DURATION][period_type]}
@@ -125,17 +148,37 @@ class LinkyClient(object):
             start = start.strftime("%Y-%m-%d")
         if end is not None:
             end = end.strftime("%Y-%m-%d")
+        return start, end
 
-        data = self._get_data(_MAP[_RESSOURCE][period_type], start, end)
-        data['period_type'] = period_type
+    def _store_data(self, period_type, data):
+        from .series import MeterReading
 
+        data['period_type'] = period_type
         self._data[period_type] = data
+        # Drops the formatted views of the previous fetch
+        self._readings[period_type] = MeterReading(data, period_type)
         return data
 
-    def fetch_data(self):
-        """Get the latest data from Enedis."""
-        for t in [HOURLY, DAILY, MONTHLY, YEARLY]:
-            self.get_data_per_period(t)
+    def _aggregate_windows(self):
+        """Windows of the periods derived from daily data, and the window covering them all."""
+        windows = dict((t, self._get_period_window(t)) for t in [DAILY, MONTHLY, YEARLY])
+        start = min(window[0] for window in windows.values())
+        end = max(window[1] for window in windows.values())
+        return windows, (start, end)
+
+    def _store_aggregates(self, data, windows):
+        """Store each period as the slice of daily data within its window."""
+        for period_type, (start, end) in windows.items():
+            period_data = dict(data)
+            period_data['start'] = start
+            period_data['end'] = end
+            period_data['interval_reading'] = [p for p in data.get('interval_reading', [])
+                                               if start <= p['date'][:10] < end]
+            self._store_data(period_type, period_data)
+
+    def get_meter_reading(self, period_type=HOURLY) -> Optional['MeterReading']:
+        """Typed view of the data stored for a period, None until it is fetched."""
+        return self._readings.get(period_type)
 
     def get_data(self):
         formatted_data = dict()
@@ -144,6 +187,152 @@ class LinkyClient(object):
                 formatted_data[t] = self.format_data(self._data[t])
         return formatted_data
 
+
+class LinkyClient(BaseLinkyClient):
+
+    def __init__(self, auth: AbstractAuth, authorize_duration="P1Y", cache: Optional[MeteringCache] = None,
+                 sync_state: Optional[SyncState] = None, sinks: Optional[List['Sink']] = None,
+                 customers: Optional[CustomerCache] = None, fill_gaps: bool = False,
+                 response_ttl: float = DEFAULT_RESPONSE_TTL):
+        """Initialize the client object.
+
+        Every meter reading fetched is also appended to each export sink.
+        customers memoizes customer data, an in-memory CustomerCache by default.
+        With fill_gaps, days with missing readings are requested a second time.
+        Successful answers are reused for response_ttl seconds, 0 always calls Enedis.
+        """
+        BaseLinkyClient.__init__(self, LinkyAPI(auth, authorize_duration, cache=cache, response_ttl=response_ttl))
+        self._customers = customers if customers is not None else CustomerCache(self._api)
+        self._sync_state = sync_state if sync_state is not None else SyncState()
+        self._sinks = sinks or []
+        self._fill_gaps = fill_gaps
+
+    def _get_data(self, p_p_resource_id, start_date=None, end_date=None, usage_point_id=None,
+                  max_workers=DEFAULT_MAX_WORKERS):
+        """Get data."""
+
+        try:
+            if usage_point_id is None:
+                usage_point_id = self._default_usage_point_id()
+            scope = self._scope(p_p_resource_id)
+            # Windows longer than Enedis allows are split and fetched in parallel
+            data = self._api.get_metering_data_range(scope, usage_point_id, start_date, end_date,
+                                                     max_workers=max_workers, fill_gaps=self._fill_gaps)
+        except OSError as e:
+            raise PyLinkyAccessException("Could not access enedis.fr: " + str(e))
+
+        for sink in self._sinks:
+            sink.write_meter_reading(data, scope, usage_point_id=usage_point_id)
+        return data
+
+    def stream_data(self, period_type=HOURLY, start=None, end=None, usage_point_id=None):
+        """Yield (epoch timestamp, value) pairs of a period as they are received."""
+        start, end = self._get_period_window(period_type, start, end)
+        if usage_point_id is None:
+            usage_point_id = self._default_usage_point_id()
+        scope = self._scope(_MAP[_RESSOURCE][period_type])
+        try:
+            for reading in self._api.stream_metering_data(scope, usage_point_id, start, end):
+                yield reading
+        except OSError as e:
+            raise PyLinkyAccessException("Could not access enedis.fr: " + str(e))
+
+    def get_data_per_period(self, period_type=HOURLY, start=None, end=None):
+        start, end = self._get_period_window(period_type, start, end)
+        data = self._get_data(_MAP[_RESSOURCE][period_type], start, end)
+        return self._store_data(period_type, data)
+
+    def fetch_data(self, derive_aggregates=False):
+        """Get the latest data from Enedis.
+
+        With derive_aggregates, daily consumption is requested once over the
+        widest window and the daily, monthly and yearly periods are computed
+        from it locally: two API calls instead of four.
+        """
+        if not derive_aggregates:
+            for t in [HOURLY, DAILY, MONTHLY, YEARLY]:
+                self.get_data_per_period(t)
+            return
+
+        self.get_data_per_period(HOURLY)
+        windows, (start, end) = self._aggregate_windows()
+        self._store_aggregates(self._get_data(_MAP[_RESSOURCE][DAILY], start, end), windows)
+
+    def sync(self, scope='CONSUMPTION_LOAD_CURVE', usage_point_id=None, initial_days=SYNC_INITIAL_DAYS,
+             end: Optional[datetime.date] = None):
+        """Fetch only the readings newer than the last one synced.
+
+        The first sync of a usage point and endpoint goes initial_days back,
+        the following ones request [last reading, end), end is today by
+        default. Returns the meter reading restricted to the new readings.
+        """
+        if usage_point_id is None:
+            usage_point_id = self._default_usage_point_id()
+
+        today = end if end is not None else datetime.date.today()
+        last = self._sync_state.get(usage_point_id, scope)
+        if last is None:
+            start = today - datetime.timedelta(days=initial_days)
+        elif len(last) > 10:
+            # Load curve: the day of the last reading may still be incomplete
+            start = datetime.datetime.strptime(last[:10], "%Y-%m-%d").date()
+        else:
+            start = datetime.datetime.strptime(last, "%Y-%m-%d").date() + datetime.timedelta(days=1)
+
+        if start >= today:
+            return {'usage_point_id': usage_point_id, 'interval_reading': []}
+
+        try:
+            data = self._api.get_metering_data_range(scope, usage_point_id,
+                                                     start.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"))
+        except OSError as e:
+            raise PyLinkyAccessException("Could not access enedis.fr: " + str(e))
+
+        data['interval_reading'] = [p for p in data.get('interval_reading', []) if last is None or p['date'] > last]
+        for sink in self._sinks:
+            sink.write_meter_reading(data, scope, usage_point_id=usage_point_id)
+        if data['interval_reading']:
+            self._sync_state.set(usage_point_id, scope, max(p['date'] for p in data['interval_reading']))
+        return data
+
+    def fetch_batch(self, usage_point_ids, period_types=(HOURLY, DAILY, MONTHLY, YEARLY), start=None, end=None,
+                    max_workers=DEFAULT_BATCH_WORKERS):
+        """Fetch periods for many usage points concurrently.
+
+        Every (usage point, period) pair runs on a worker pool over the shared
+        session, the chunks of a pair are fetched one after the other: at most
+        max_workers requests are in flight, keep it within the pool_maxsize of
+        the AbstractAuth (10 by default) so connections are reused.
+        start and end apply to every period, default windows are used
+        otherwise. Returns a MeterResult per usage point; a failing meter or
+        period is reported in its result and does not stop the others.
+        """
+        results = dict((upid, MeterResult(upid)) for upid in usage_point_ids)
+
+        def fetch(upid, period_type):
+            period_start, period_end = self._get_period_window(period_type, start, end)
+            data = self._get_data(_MAP[_RESSOURCE][period_type], period_start, period_end, usage_point_id=upid,
+                                  max_workers=1)
+            data['period_type'] = period_type
+            return data
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict((executor.submit(fetch, upid, period_type), (upid, period_type))
+                           for upid in results for period_type in period_types)
+            for future in as_completed(futures):
+                upid, period_type = futures[future]
+                try:
+                    results[upid].data[period_type] = future.result()
+                except Exception as e:
+                    results[upid].errors[period_type] = e
+        return results
+
+    def get_customer_profile(self, usage_point_id=None) -> CustomerProfile:
+        """Customer data of a usage point, fetched on first access and memoized."""
+        if usage_point_id is None:
+            usage_point_id = self._default_usage_point_id()
+        return self._customers.profile(usage_point_id)
+
     def close_session(self):
         """Close current session."""
         self._api.close_session()
@@ -0,0 +1,198 @@
+import collections
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .linkyapi import parse_response
+
+# /v3/customers endpoints and the LinkyAPI methods fetching them
+CUSTOMER_SCOPES = {
+"IDENTITY": "get_customer_identity",
+"CONTACT_DATA": "get_customer_contact_data",
+"CONTRACTS": "get_customer_usage_points_contracts",
+"ADDRESSES": "get_customer_usage_points_addresses"
+}
+
+DEFAULT_CUSTOMER_TTL = 24 * 3600
+DEFAULT_MAX_PROFILES = 1000
+DEFAULT_MAX_WORKERS = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    usage_point_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (usage_point_id, scope)
+);
+"""
+
+
+class CustomerStore(object):
+    """SQLite store of decoded customers answers, shared between runs."""
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.Lock()
+        import sqlite3
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, usage_point_id, scope):
+        """Return (data, fetched_at), or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT data, fetched_at FROM customers WHERE usage_point_id = ? AND scope = ?",
+                                     (usage_point_id, scope)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, usage_point_id, scope, data, fetched_at):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO customers VALUES (?, ?, ?, ?)",
+                               (usage_point_id, scope, json.dumps(data), fetched_at))
+
+    def delete(self, usage_point_id=None):
+        with self._lock, self._conn:
+            if usage_point_id is None:
+                self._conn.execute("DELETE FROM customers")
+            else:
+                self._conn.execute("DELETE FROM customers WHERE usage_point_id = ?", (usage_point_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CustomerProfile(object):
+    """Customer data of one usage point, each part fetched on first access."""
+
+    def __init__(self, usage_point_id, customers):
+        self.usage_point_id = usage_point_id
+        self._customers = customers
+
+    @property
+    def identity(self):
+        return self._customers.get(self.usage_point_id, 'IDENTITY')
+
+    @property
+    def contact_data(self):
+        return self._customers.get(self.usage_point_id, 'CONTACT_DATA')
+
+    @property
+    def contracts(self):
+        return self._customers.get(self.usage_point_id, 'CONTRACTS')
+
+    @property
+    def addresses(self):
+        return self._customers.get(self.usage_point_id, 'ADDRESSES')
+
+    def load(self, scopes=tuple(CUSTOMER_SCOPES), return_exceptions=False):
+        """Return {scope: data}, the missing parts are fetched concurrently."""
+        return self._customers.load(self.usage_point_id, scopes, return_exceptions)
+
+    def invalidate(self):
+        self._customers.invalidate(self.usage_point_id)
+
+
+class CustomerCache(object):
+    """Memoizes the /v3/customers answers of usage points.
+
+    Answers are kept ttl seconds, for at most max_profiles usage points (least
+    recently used are dropped first). A CustomerStore keeps them across runs.
+    """
+
+    def __init__(self, api, ttl=DEFAULT_CUSTOMER_TTL, max_profiles=DEFAULT_MAX_PROFILES,
+                 store=None, max_workers=DEFAULT_MAX_WORKERS):
+        self._api = api
+        self.ttl = ttl
+        self.max_profiles = max_profiles
+        self.max_workers = max_workers
+        self._store = store
+        self._lock = threading.Lock()
+        # usage_point_id -> {scope: (data, fetched_at)}, in least recently used order
+        self._profiles = collections.OrderedDict()
+
+    def profile(self, usage_point_id):
+        return CustomerProfile(usage_point_id, self)
+
+    def get(self, usage_point_id, scope):
+        return self.load(usage_point_id, [scope])[scope]
+
+    def load(self, usage_point_id, scopes=tuple(CUSTOMER_SCOPES), return_exceptions=False):
+        """Return {scope: data}, the missing parts are fetched concurrently.
+
+        The first failing scope raises, unless return_exceptions: its
+        exception is returned as its data, and the other scopes are kept.
+        """
+        now = time.time()
+        result = {}
+        missing = []
+        for scope in scopes:
+            entry = self._lookup(usage_point_id, scope, now)
+            if entry is None:
+                missing.append(scope)
+            else:
+                result[scope] = entry
+
+        def fetch(scope):
+            try:
+                response = getattr(self._api, CUSTOMER_SCOPES[scope])(usage_point_id)
+                return parse_response(response.status_code, response.text)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        if len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                fetched = list(executor.map(fetch, missing))
+        else:
+            fetched = [fetch(scope) for scope in missing]
+
+        now = time.time()
+        for scope, data in zip(missing, fetched):
+            if isinstance(data, Exception):
+                result[scope] = data
+                continue
+            self._remember(usage_point_id, scope, data, now)
+            if self._store is not None:
+                self._store.put(usage_point_id, scope, data, now)
+            result[scope] = data
+        return result
+
+    def _fresh(self, fetched_at, now):
+        return self.ttl is None or fetched_at + self.ttl > now
+
+    def _lookup(self, usage_point_id, scope, now):
+        with self._lock:
+            entries = self._profiles.get(usage_point_id)
+            if entries is not None:
+                self._profiles.move_to_end(usage_point_id)
+                if scope in entries and self._fresh(entries[scope][1], now):
+                    return entries[scope][0]
+        if self._store is None:
+            return None
+        stored = self._store.get(usage_point_id, scope)
+        if stored is None or not self._fresh(stored[1], now):
+            return None
+        self._remember(usage_point_id, scope, stored[0], stored[1])
+        return stored[0]
+
+    def _remember(self, usage_point_id, scope, data, fetched_at):
+        with self._lock:
+            self._profiles.setdefault(usage_point_id, {})[scope] = (data, fetched_at)
+            self._profiles.move_to_end(usage_point_id)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def invalidate(self, usage_point_id=None):
+        """Forget one usage point, or all of them, in memory and in the store."""
+        with self._lock:
+            if usage_point_id is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(usage_point_id, None)
+        if self._store is not None:
+            self._store.delete(usage_point_id)
@@ -0,0 +1,126 @@
+import datetime
+import heapq
+import json
+import logging
+import threading
+import time
+import zlib
+
+from .files import write_json
+
+_LOGGER = logging.getLogger(__name__)
+
+# Enedis publishes the data of a day the next morning (J+1)
+PUBLICATION_TIME = datetime.time(8, 0)
+# Daily syncs are spread over this many seconds after the publication time
+DEFAULT_SPREAD = 10 * 3600
+DEFAULT_RETRY_DELAY = 3600
+DEFAULT_SCOPES = ('DAILY_CONSUMPTION', 'CONSUMPTION_LOAD_CURVE')
+# Longest sleep between two checks of the schedule, so stop() is honoured
+MAX_SLEEP = 60
+
+
+class TokenFile(object):
+    """OAuth token saved as JSON, use save as the token_updater of AbstractAuth."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, token):
+        write_json(self.path, token)
+
+
+def published_until(now, publication_time=PUBLICATION_TIME):
+    """First day whose data is not published yet at epoch now."""
+    local = datetime.datetime.fromtimestamp(now)
+    if local.time() >= publication_time:
+        return local.date()
+    return local.date() - datetime.timedelta(days=1)
+
+
+class Poller(object):
+    """Syncs usage points once a day, once Enedis has published the previous day.
+
+    Each usage point gets a stable slot in the spread seconds following the
+    publication time, so thousands of meters do not hit Enedis at the same
+    moment. Readings are stored by the sinks and the sync state of the
+    LinkyClient; a failed sync is retried after retry_delay seconds.
+    """
+
+    def __init__(self, client, usage_point_ids=None, scopes=DEFAULT_SCOPES, publication_time=PUBLICATION_TIME,
+                 spread=DEFAULT_SPREAD, retry_delay=DEFAULT_RETRY_DELAY, clock=time.time):
+        self.client = client
+        self.usage_point_ids = usage_point_ids
+        self.scopes = scopes
+        self.publication_time = publication_time
+        self.spread = spread
+        self.retry_delay = retry_delay
+        self._clock = clock
+        self._stop = threading.Event()
+        # (due epoch, usage point id)
+        self._schedule = []
+
+    def slot(self, usage_point_id, day):
+        """Epoch of the sync of a usage point on day."""
+        offset = zlib.crc32(usage_point_id.encode("utf-8")) % max(1, int(self.spread))
+        start = datetime.datetime.combine(day, self.publication_time)
+        return time.mktime(start.timetuple()) + offset
+
+    def _next_slot(self, usage_point_id, now):
+        day = datetime.datetime.fromtimestamp(now).date()
+        due = self.slot(usage_point_id, day)
+        if due <= now:
+            due = self.slot(usage_point_id, day + datetime.timedelta(days=1))
+        return due
+
+    def schedule(self):
+        """Plan every usage point; ones whose slot of today has passed are due now, to catch up."""
+        now = self._clock()
+        usage_point_ids = self.usage_point_ids
+        if usage_point_ids is None:
+            usage_point_ids = self.client.get_usage_point_ids()
+        today = datetime.datetime.fromtimestamp(now).date()
+        self._schedule = [(max(now, self.slot(upid, today)), upid) for upid in usage_point_ids]
+        heapq.heapify(self._schedule)
+
+    def next_due(self):
+        return self._schedule[0][0] if self._schedule else None
+
+    def run_pending(self):
+        """Sync the usage points that are due, return how many were synced."""
+        done = 0
+        while self._schedule and self._schedule[0][0] <= self._clock() and not self._stop.is_set():
+            _, usage_point_id = heapq.heappop(self._schedule)
+            now = self._clock()
+            try:
+                self.sync(usage_point_id, published_until(now, self.publication_time))
+            except Exception as e:
+                _LOGGER.warning("Sync of %s failed, retrying in %ss: %s", usage_point_id, self.retry_delay, e)
+                heapq.heappush(self._schedule, (now + self.retry_delay, usage_point_id))
+                continue
+            heapq.heappush(self._schedule, (self._next_slot(usage_point_id, now), usage_point_id))
+            done += 1
+        return done
+
+    def sync(self, usage_point_id, end):
+        for scope in self.scopes:
+            data = self.client.sync(scope, usage_point_id, end=end)
+            _LOGGER.info("Synced %s %s: %d readings", usage_point_id, scope, len(data.get('interval_reading', [])))
+
+    def run_forever(self):
+        """Run until stop() is called."""
+        self._stop.clear()
+        if not self._schedule:
+            self.schedule()
+        while not self._stop.is_set():
+            self.run_pending()
+            due = self.next_due()
+            delay = MAX_SLEEP if due is None else min(MAX_SLEEP, max(0, due - self._clock()))
+            self._stop.wait(delay)
+
+    def stop(self):
+        self._stop.set()
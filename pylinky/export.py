@@ -0,0 +1,160 @@
+import collections
+import csv
+import itertools
+import os
+import threading
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .exceptions import PyLinkyException
+from .series import parse_timestamp
+
+COLUMNS = ('timestamp', 'value', 'unit', 'measure_type')
+BATCH_SIZE = 10000
+# Partitions whose written timestamps are kept in memory
+DEFAULT_MAX_PARTITIONS = 64
+
+
+class Sink(object):
+    """Append-only export of readings, partitioned per usage point and endpoint.
+
+    Rows are (epoch timestamp, value, unit, measure type). Readings whose
+    timestamp was already written for a usage point and endpoint are skipped,
+    so overlapping fetches can be exported again safely, and older readings
+    (other periods, refilled gaps) are still appended. The timestamps of a
+    partition are read back from its files on first write, and kept for the
+    max_partitions partitions most recently written. Subclasses implement
+    _append and _read_timestamps for a file format.
+    """
+
+    def __init__(self, directory, max_partitions=DEFAULT_MAX_PARTITIONS):
+        self.directory = directory
+        self.max_partitions = max_partitions
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # partition directory -> lock held while it is checked and appended to
+        self._partition_locks = {}
+        # partition directory -> set of written timestamps, least recently used first
+        self._written = collections.OrderedDict()
+
+    def partition(self, usage_point_id, scope):
+        return os.path.join(self.directory, "usage_point_id=" + usage_point_id, "scope=" + scope)
+
+    def write_meter_reading(self, meter_reading, scope, usage_point_id=None):
+        """Export a decoded meter reading, return the number of rows appended."""
+        usage_point_id = meter_reading.get('usage_point_id', usage_point_id)
+        unit = (meter_reading.get('reading_type') or {}).get('unit')
+        rows = ((parse_timestamp(p['date']), int(p['value']), unit, p.get('measure_type'))
+                for p in meter_reading.get('interval_reading', []))
+        return self.write_rows(usage_point_id, scope, rows)
+
+    def write(self, usage_point_id, scope, readings, unit=None, measure_type=None):
+        """Export (epoch timestamp, value) pairs, e.g. from LinkyClient.stream_data."""
+        return self.write_rows(usage_point_id, scope, ((t, v, unit, measure_type) for t, v in readings))
+
+    def write_rows(self, usage_point_id, scope, rows):
+        directory = self.partition(usage_point_id, scope)
+        with self._partition_lock(directory):
+            timestamps = self._written_timestamps(directory)
+            rows = (row for row in rows if row[0] not in timestamps)
+            written = 0
+            while True:
+                batch = collections.OrderedDict()
+                for row in itertools.islice(rows, BATCH_SIZE):
+                    batch.setdefault(row[0], row)
+                if not batch:
+                    return written
+                os.makedirs(directory, exist_ok=True)
+                self._append(directory, list(batch.values()))
+                timestamps.update(batch)
+                written += len(batch)
+
+    def _partition_lock(self, directory):
+        with self._lock:
+            return self._partition_locks.setdefault(directory, threading.Lock())
+
+    def _written_timestamps(self, directory):
+        """Set of the timestamps in a partition, called under its lock."""
+        with self._lock:
+            timestamps = self._written.get(directory)
+            if timestamps is not None:
+                self._written.move_to_end(directory)
+                return timestamps
+        timestamps = set(self._read_timestamps(directory)) if os.path.isdir(directory) else set()
+        with self._lock:
+            self._written[directory] = timestamps
+            while len(self._written) > self.max_partitions:
+                self._written.popitem(last=False)
+        return timestamps
+
+    def _append(self, directory, rows):
+        raise NotImplementedError
+
+    def _read_timestamps(self, directory):
+        """Epoch timestamps of the rows already in a partition directory."""
+        raise NotImplementedError
+
+
+class CsvSink(Sink):
+    """One readings.csv per partition, epoch seconds timestamps."""
+
+    def _append(self, directory, rows):
+        path = os.path.join(directory, "readings.csv")
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(COLUMNS)
+            writer.writerows(rows)
+
+    def _read_timestamps(self, directory):
+        path = os.path.join(directory, "readings.csv")
+        if not os.path.exists(path):
+            return []
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            return [int(row[0]) for row in reader if row]
+
+
+class ParquetSink(Sink):
+    """One Parquet file per appended batch, in Hive-style partitions (requires pyarrow)."""
+
+    def __init__(self, directory, max_partitions=DEFAULT_MAX_PARTITIONS):
+        if pyarrow is None:
+            raise PyLinkyException("pyarrow is required to export Parquet files")
+        Sink.__init__(self, directory, max_partitions)
+        self._counter = itertools.count()
+
+    @staticmethod
+    def schema():
+        return pyarrow.schema([
+            # Parquet has no second resolution
+            ('timestamp', pyarrow.timestamp('ms')),
+            ('value', pyarrow.int64()),
+            ('unit', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+            ('measure_type', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ])
+
+    def _append(self, directory, rows):
+        schema = self.schema()
+        timestamps, values, units, measure_types = zip(*rows)
+        table = pyarrow.Table.from_arrays([
+            pyarrow.array(timestamps, pyarrow.int64()).cast(pyarrow.timestamp('s')).cast(schema.field('timestamp').type),
+            pyarrow.array(values, pyarrow.int64()),
+            pyarrow.array(units, pyarrow.string()).dictionary_encode().cast(schema.field('unit').type),
+            pyarrow.array(measure_types, pyarrow.string()).dictionary_encode().cast(schema.field('measure_type').type),
+        ], schema=schema)
+        name = "part-{}-{}.parquet".format(time.time_ns(), next(self._counter))
+        pyarrow.parquet.write_table(table, os.path.join(directory, name))
+
+    def _read_timestamps(self, directory):
+        if not any(name.endswith(".parquet") for name in os.listdir(directory)):
+            return []
+        column = pyarrow.parquet.read_table(directory, columns=['timestamp']).column('timestamp')
+        return [t // 1000 for t in column.cast(pyarrow.int64()).to_pylist()]
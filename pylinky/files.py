@@ -0,0 +1,21 @@
+import json
+import os
+
+
+def write_json(path, value):
+    """Replace the file at path with value as JSON, atomically.
+
+    value is written to a temporary file of the same directory, then moved
+    over path: readers never see a partial file.
+    """
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + "-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,132 @@
+import datetime
+
+from dateutil import tz
+
+from .cache import group_days, reading_day
+from .series import parse_timestamp
+
+# Seconds between two readings, per interval_length / measuring_period
+STEPS = {
+"PT5M": 300,
+"PT10M": 600,
+"PT15M": 900,
+"PT30M": 1800,
+"PT60M": 3600,
+"P1D": 86400
+}
+
+# Dates returned by Enedis are wall-clock times of metropolitan France
+TIMEZONE = tz.gettz("Europe/Paris")
+
+_SECONDS_PER_DAY = 86400
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def reading_step(meter_reading):
+    """Seconds between two readings of a meter reading."""
+    points = meter_reading.get('interval_reading') or []
+    interval_length = points[0].get('interval_length') if points else None
+    if interval_length is None:
+        interval_length = (meter_reading.get('reading_type') or {}).get('measuring_period')
+    if interval_length in STEPS:
+        return STEPS[interval_length]
+    if points and len(points[0]['date']) > 10:
+        return STEPS["PT30M"]
+    return STEPS["P1D"]
+
+
+def _to_datetime(timestamp):
+    return _EPOCH + datetime.timedelta(seconds=timestamp)
+
+
+def _utcoffset(day, timezone):
+    return _to_datetime(day).replace(tzinfo=timezone).utcoffset()
+
+
+def _transition_days(first, last, timezone):
+    """Epoch timestamps of the days of [first, last] whose UTC offset changes.
+
+    Offsets are compared four weeks apart, then day by day where they differ:
+    DST changes are months apart.
+    """
+    days = []
+    window = 28 * _SECONDS_PER_DAY
+    start = first - first % _SECONDS_PER_DAY
+    while start <= last:
+        if _utcoffset(start, timezone) != _utcoffset(start + window, timezone):
+            days.extend(day for day in range(start, min(start + window, last + 1), _SECONDS_PER_DAY)
+                        if _utcoffset(day, timezone) != _utcoffset(day + _SECONDS_PER_DAY, timezone))
+        start += window
+    return days
+
+
+def expected_timestamps(start, end, step, timezone=TIMEZONE):
+    """Epoch timestamps of the readings of [start, end) days.
+
+    Load curve readings are stamped with the end of their interval, from
+    start + step to end at midnight; daily readings from start to the day
+    before end. Wall-clock times skipped by a DST change in timezone (an
+    hour on the last Sunday of March in Europe/Paris) are not expected, the
+    hour repeated in autumn shares its timestamps.
+    """
+    first = parse_timestamp(start)
+    last = parse_timestamp(end)
+    if step < _SECONDS_PER_DAY:
+        first += step
+    else:
+        last -= step
+    expected = range(first, last + 1, step)
+    if step >= _SECONDS_PER_DAY or timezone is None:
+        return expected
+    skipped = set(t for day in _transition_days(first, last, timezone)
+                  for t in expected[max(0, (day - first + step - 1) // step):(day + _SECONDS_PER_DAY - first) // step]
+                  if not tz.datetime_exists(_to_datetime(t), timezone))
+    return [t for t in expected if t not in skipped] if skipped else expected
+
+
+def missing_timestamps(meter_reading, start=None, end=None, step=None, timestamps=None):
+    """Sorted epoch timestamps of the readings absent from a meter reading.
+
+    timestamps are those of its readings when already parsed.
+    """
+    start = start or meter_reading.get('start')
+    end = end or meter_reading.get('end')
+    if not start or not end:
+        return []
+    step = step or reading_step(meter_reading)
+    if timestamps is None:
+        timestamps = (parse_timestamp(p['date']) for p in meter_reading.get('interval_reading', []))
+    present = set(map(int, timestamps))
+    return [t for t in expected_timestamps(start, end, step) if t not in present]
+
+
+def _format(timestamp, step):
+    date = _to_datetime(timestamp)
+    return date.strftime("%Y-%m-%d" if step >= _SECONDS_PER_DAY else "%Y-%m-%d %H:%M:%S")
+
+
+def find_gaps(meter_reading, start=None, end=None, step=None):
+    """Missing readings of a meter reading, as (first, last) date ranges.
+
+    start and end default to the window of the meter reading.
+    """
+    step = step or reading_step(meter_reading)
+    gaps = []
+    for timestamp in missing_timestamps(meter_reading, start, end, step):
+        if gaps and gaps[-1][1] + step == timestamp:
+            gaps[-1][1] = timestamp
+        else:
+            gaps.append([timestamp, timestamp])
+    return [(_format(first, step), _format(last, step)) for first, last in gaps]
+
+
+def gap_windows(gaps):
+    """[start, end) day windows covering gaps, to re-fetch them."""
+    days = set()
+    for first, last in gaps:
+        day = datetime.datetime.strptime(reading_day(first), "%Y-%m-%d").date()
+        last_day = datetime.datetime.strptime(reading_day(last), "%Y-%m-%d").date()
+        while day <= last_day:
+            days.add(day.strftime("%Y-%m-%d"))
+            day += datetime.timedelta(days=1)
+    return group_days(sorted(days))
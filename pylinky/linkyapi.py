@@ -1,4 +1,13 @@
+import datetime
+import json
+import threading
+import time
+from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from .abstractauth import AbstractAuth
+from .cache import MeteringCache, day_range, group_days
+from .exceptions import PyLinkyException, PyLinkyEnedisException, PyLinkyMaintenanceException
 
 SCOPE = {
 "CONSUMPTION_LOAD_CURVE": "/v4/metering_data/consumption_load_curve",
@@ -12,12 +21,170 @@ SCOPE = {
 "ADDRESSES": "/v3/customers/usage_points/addresses"
 }
 
+# Longest window, in days, Enedis accepts in one call to a metering endpoint
+MAX_DAYS = {
+"CONSUMPTION_LOAD_CURVE": 7,
+"PRODUCTION_LOAD_CURVE": 7,
+"DAILY_CONSUMPTION_MAX_POWER": 365,
+"DAILY_PRODUCTION": 365,
+"DAILY_CONSUMPTION": 365
+}
+
+DEFAULT_MAX_WORKERS = 4
+STREAM_CHUNK_SIZE = 64 * 1024
+# Seconds identical requests are answered from the last response
+DEFAULT_RESPONSE_TTL = 5
+DEFAULT_MAX_RESPONSES = 256
+
+_DATE_FORMAT = "%Y-%m-%d"
+
+
+def split_range(start, end, max_days):
+    """Split [start, end) into consecutive windows of at most max_days days.
+
+    start and end are dates or "YYYY-MM-DD" strings, windows are returned as strings.
+    """
+    if isinstance(start, str):
+        start = datetime.datetime.strptime(start, _DATE_FORMAT).date()
+    if isinstance(end, str):
+        end = datetime.datetime.strptime(end, _DATE_FORMAT).date()
+
+    windows = []
+    step = datetime.timedelta(days=max_days)
+    while start < end:
+        chunk_end = min(start + step, end)
+        windows.append((start.strftime(_DATE_FORMAT), chunk_end.strftime(_DATE_FORMAT)))
+        start = chunk_end
+    return windows
+
+
+def merge_meter_readings(meter_readings):
+    """Stitch chunked meter readings into one, ordered and de-duplicated on date."""
+    meter_readings = [m for m in meter_readings if m]
+    if not meter_readings:
+        return {}
+
+    points = {}
+    for meter_reading in meter_readings:
+        for point in meter_reading.get('interval_reading', []):
+            points.setdefault(point['date'], point)
+
+    merged = dict(meter_readings[0])
+    merged['start'] = meter_readings[0].get('start')
+    merged['end'] = meter_readings[-1].get('end')
+    merged['interval_reading'] = [points[date] for date in sorted(points)]
+    return merged
+
+
+def request_key(scope, argument_dictionnary):
+    """Hashable key of a request, list arguments such as usage point ids included."""
+    return (scope, tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                                for name, value in argument_dictionnary.items())))
+
+
+def parse_response(status_code, text):
+    """Check status code and decode a response body, Enedis errors are raised."""
+    import simplejson
+
+    if 404 == status_code:
+        raise PyLinkyException("No data")
+
+    if 500 == status_code:
+        raise PyLinkyMaintenanceException("Site in maintenance")
+
+    try:
+        json_output = simplejson.loads(text)
+    except (OSError, json.decoder.JSONDecodeError, simplejson.errors.JSONDecodeError) as e:
+        raise PyLinkyException("Impossible to decode response: " + str(e) + "\nResponse was: " + str(text))
+
+    if isinstance(json_output, dict) and json_output.get('error'):
+        description = json_output.get('error_description')
+        description = json_output['error'] if description is None else description
+        raise PyLinkyEnedisException("Enedis.fr answered with an error: " + description)
+
+    return json_output
+
+
+def parse_meter_reading(status_code, text):
+    """Check status code and decode the meter reading of a response body."""
+    return parse_response(status_code, text)['meter_reading']
+
+
+class RequestCoalescer(object):
+    """Shares one call between concurrent identical requests.
+
+    Callers asking for a key while its call is in flight wait for that call
+    and get its outcome. Accepted results are then reused for ttl seconds,
+    keeping at most max_entries of them.
+    """
+
+    def __init__(self, ttl=DEFAULT_RESPONSE_TTL, max_entries=DEFAULT_MAX_RESPONSES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        # key -> (expires_at, result), oldest first
+        self._results = {}
+
+    def call(self, key, func, cacheable=lambda result: True, fresh=False):
+        """Return func(), or the result shared for key; fresh skips the kept results."""
+        with self._lock:
+            cached = None if fresh else self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            if self.ttl and cacheable(result):
+                self._remember(key, result)
+        future.set_result(result)
+        return result
+
+    def _remember(self, key, result):
+        now = time.monotonic()
+        self._results.pop(key, None)
+        self._results[key] = (now + self.ttl, result)
+        for old_key in list(self._results):
+            if len(self._results) <= self.max_entries and self._results[old_key][0] > now:
+                break
+            del self._results[old_key]
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
 class LinkyAPI(object):
 
-    def __init__(self, auth: AbstractAuth, authorize_duration="P1Y", ):
-        """Initialize the client object."""
+    def __init__(self, auth: AbstractAuth, authorize_duration="P1Y", cache: Optional[MeteringCache] = None,
+                 response_ttl: float = DEFAULT_RESPONSE_TTL):
+        """Initialize the client object.
+
+        Concurrent identical requests share one HTTP call, and successful
+        answers are reused for response_ttl seconds (0 disables it).
+        """
         self.authorize_duration = authorize_duration
         self._auth = auth
+        self._cache = cache
+        self._coalescer = RequestCoalescer(response_ttl)
+
+    def _request(self, scope, argument_dictionnary, fresh=False):
+        return self._coalescer.call(request_key(scope, argument_dictionnary), lambda: self._auth.request(SCOPE[scope], argument_dictionnary),
+                                    lambda response: response.status_code == 200, fresh)
 
     def get_authorisation_url(self, test_customer=""):
         auth_url = self._auth.authorization_url(self.authorize_duration, test_customer=test_customer)
@@ -31,39 +198,137 @@ class LinkyAPI(object):
 
     def get_consumption_load_curve(self, usage_point_id, start, end):
         argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
-        return self._auth.request(SCOPE['CONSUMPTION_LOAD_CURVE'], argument_dictionnary)
+        return self._request('CONSUMPTION_LOAD_CURVE', argument_dictionnary)
 
     def get_production_load_curve(self, usage_point_id, start, end):
         argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
-        return self._auth.request(SCOPE['PRODUCTION_LOAD_CURVE'], argument_dictionnary)
+        return self._request('PRODUCTION_LOAD_CURVE', argument_dictionnary)
 
     def get_daily_consumption_max_power(self, usage_point_id, start, end):
         argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
-        return self._auth.request(SCOPE['DAILY_CONSUMPTION_MAX_POWER'], argument_dictionnary)
+        return self._request('DAILY_CONSUMPTION_MAX_POWER', argument_dictionnary)
 
     def get_daily_consumption(self, usage_point_id, start, end):
         argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
-        return self._auth.request(SCOPE['DAILY_CONSUMPTION'], argument_dictionnary)
+        return self._request('DAILY_CONSUMPTION', argument_dictionnary)
 
     def get_daily_production(self, usage_point_id, start, end):
         argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
-        return self._auth.request(SCOPE['DAILY_PRODUCTION'], argument_dictionnary)
+        return self._request('DAILY_PRODUCTION', argument_dictionnary)
+
+    def get_metering_data(self, scope, usage_point_id, start, end):
+        argument_dictionnary = {'usage_point_id':usage_point_id, 'start': start, 'end': end}
+        return self._request(scope, argument_dictionnary)
+
+    def _fetch_windows(self, scope, usage_point_id, windows, max_workers=DEFAULT_MAX_WORKERS, fresh=False):
+        """Fetch and decode each window, in parallel, keeping the windows order."""
+        def fetch(window):
+            argument_dictionnary = {'usage_point_id':usage_point_id, 'start': window[0], 'end': window[1]}
+            raw_res = self._request(scope, argument_dictionnary, fresh)
+            return parse_meter_reading(raw_res.status_code, raw_res.text)
+
+        if len(windows) == 1:
+            return [fetch(windows[0])]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(windows))) as executor:
+            return list(executor.map(fetch, windows))
+
+    def get_metering_data_range(self, scope, usage_point_id, start, end, max_workers=DEFAULT_MAX_WORKERS,
+                                fill_gaps=False):
+        """Fetch and decode any window of a metering endpoint.
+
+        The window is split into chunks Enedis accepts (see MAX_DAYS), the chunks are
+        fetched in parallel and their interval_reading merged into one meter reading.
+        With a cache, only the days missing from it are requested. With fill_gaps,
+        the days with missing readings are requested once more.
+        """
+        if start is None or end is None:
+            return self._fetch_windows(scope, usage_point_id, [(start, end)])[0]
+
+        if self._cache is None:
+            windows = split_range(start, end, MAX_DAYS[scope]) or [(start, end)]
+            meter_reading = merge_meter_readings(self._fetch_windows(scope, usage_point_id, windows, max_workers))
+        else:
+            missing = self._cache.missing_days(usage_point_id, scope, day_range(start, end))
+            self._fetch_into_cache(scope, usage_point_id, group_days(missing), max_workers)
+            meter_reading = self._cache.get(usage_point_id, scope, start, end)
+
+        if fill_gaps and meter_reading:
+            meter_reading = self._fill_gaps(scope, usage_point_id, meter_reading, start, end, max_workers)
+        return meter_reading
+
+    def _fetch_into_cache(self, scope, usage_point_id, day_windows, max_workers=DEFAULT_MAX_WORKERS, fresh=False):
+        windows = [window for window_start, window_end in day_windows
+                   for window in split_range(window_start, window_end, MAX_DAYS[scope])]
+        if windows:
+            meter_readings = self._fetch_windows(scope, usage_point_id, windows, max_workers, fresh)
+            for window, meter_reading in zip(windows, meter_readings):
+                self._cache.put(usage_point_id, scope, meter_reading, window[0], window[1])
+
+    def _fill_gaps(self, scope, usage_point_id, meter_reading, start, end, max_workers=DEFAULT_MAX_WORKERS):
+        """Request again only the days of [start, end) with missing readings."""
+        from .gaps import find_gaps, gap_windows
+
+        day_windows = gap_windows(find_gaps(meter_reading, start, end))
+        if not day_windows:
+            return meter_reading
+        if self._cache is not None:
+            # The days are stored again, with whatever Enedis answers now
+            self._fetch_into_cache(scope, usage_point_id, day_windows, max_workers, fresh=True)
+            return self._cache.get(usage_point_id, scope, start, end)
+
+        windows = [window for window_start, window_end in day_windows
+                   for window in split_range(window_start, window_end, MAX_DAYS[scope])]
+        merged = merge_meter_readings([meter_reading] + self._fetch_windows(scope, usage_point_id, windows,
+                                                                            max_workers, fresh=True))
+        merged['start'] = meter_reading.get('start')
+        merged['end'] = meter_reading.get('end')
+        return merged
+
+    def stream_metering_data(self, scope, usage_point_id, start, end, chunk_size=STREAM_CHUNK_SIZE):
+        """Yield (epoch timestamp, value) pairs of any window of a metering endpoint.
+
+        Windows are requested one after the other and decoded while the body
+        arrives, so memory use does not grow with the size of the window.
+        """
+        from .stream import iter_readings
+
+        windows = [(start, end)]
+        if start is not None and end is not None:
+            windows = split_range(start, end, MAX_DAYS[scope]) or windows
+
+        for window in windows:
+            argument_dictionnary = {'usage_point_id':usage_point_id, 'start': window[0], 'end': window[1]}
+            raw_res = self._auth.request(SCOPE[scope], argument_dictionnary, stream=True)
+            try:
+                if raw_res.status_code != 200:
+                    parse_meter_reading(raw_res.status_code, raw_res.text)
+                    raise PyLinkyException("Unexpected status code " + str(raw_res.status_code))
+                for reading in iter_readings(raw_res.iter_content(chunk_size)):
+                    yield reading
+            finally:
+                raw_res.close()
+
+    def get_consumption_load_curve_range(self, usage_point_id, start, end, max_workers=DEFAULT_MAX_WORKERS):
+        return self.get_metering_data_range('CONSUMPTION_LOAD_CURVE', usage_point_id, start, end, max_workers)
+
+    def get_production_load_curve_range(self, usage_point_id, start, end, max_workers=DEFAULT_MAX_WORKERS):
+        return self.get_metering_data_range('PRODUCTION_LOAD_CURVE', usage_point_id, start, end, max_workers)
 
     def get_customer_identity(self, usage_point_id):
         argument_dictionnary = {'usage_point_id': usage_point_id}
-        return self._auth.request(SCOPE['IDENTITY'], argument_dictionnary)
+        return self._request('IDENTITY', argument_dictionnary)
 
     def get_customer_contact_data(self, usage_point_id):
         argument_dictionnary = {'usage_point_id': usage_point_id}
-        return self._auth.request(SCOPE['CONTACT_DATA'], argument_dictionnary)
+        return self._request('CONTACT_DATA', argument_dictionnary)
 
     def get_customer_usage_points_contracts(self, usage_point_id):
         argument_dictionnary = {'usage_point_id': usage_point_id}
-        return self._auth.request(SCOPE['CONTRACTS'], argument_dictionnary)
+        return self._request('CONTRACTS', argument_dictionnary)
 
     def get_customer_usage_points_addresses(self, usage_point_id):
         argument_dictionnary = {'usage_point_id': usage_point_id}
-        return self._auth.request(SCOPE['ADDRESSES'], argument_dictionnary)
+        return self._request('ADDRESSES', argument_dictionnary)
 
     def close_session(self):
         """Close current session."""
@@ -0,0 +1,127 @@
+import threading
+from typing import Optional
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class RequestEvent(object):
+    """One call of AbstractAuth.request, retries included."""
+
+    __slots__ = ('path', 'usage_point_id', 'status_code', 'duration', 'bytes', 'retries', 'error')
+
+    def __init__(self, path: str, usage_point_id: Optional[str], status_code: Optional[int], duration: float,
+                 bytes: int = 0, retries: int = 0, error: Optional[BaseException] = None):
+        self.path = path
+        self.usage_point_id = usage_point_id
+        # None when no answer was received, see error
+        self.status_code = status_code
+        self.duration = duration
+        self.bytes = bytes
+        self.retries = retries
+        self.error = error
+
+    def __repr__(self):
+        return "RequestEvent({!r}, {!r}, status_code={}, duration={:.3f}, bytes={}, retries={})".format(
+            self.path, self.usage_point_id, self.status_code, self.duration, self.bytes, self.retries)
+
+
+class RequestObserver(object):
+    """Base class of observers registered with AbstractAuth.add_observer."""
+
+    def on_request(self, event: RequestEvent):
+        pass
+
+    def on_refresh(self):
+        pass
+
+
+def _labels(**labels):
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics(RequestObserver):
+    """Aggregates request events per endpoint and per usage point.
+
+    Keeps a latency histogram, bytes received, retries and status codes per
+    endpoint, latency per usage point and the number of token refreshes.
+    to_openmetrics renders them in the OpenMetrics text format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # endpoint -> [count per bucket + Inf, sum]
+            self.latency = {}
+            self.statuses = {}
+            self.bytes = {}
+            self.retries = {}
+            # usage point -> [count, sum]
+            self.meter_latency = {}
+            self.refreshes = 0
+
+    def on_request(self, event: RequestEvent):
+        status = "error" if event.status_code is None else str(event.status_code)
+        with self._lock:
+            histogram = self.latency.setdefault(event.path, [[0] * (len(self.buckets) + 1), 0.0])
+            for i, bound in enumerate(self.buckets):
+                if event.duration <= bound:
+                    histogram[0][i] += 1
+            histogram[0][-1] += 1
+            histogram[1] += event.duration
+
+            key = (event.path, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+            self.bytes[event.path] = self.bytes.get(event.path, 0) + event.bytes
+            self.retries[event.path] = self.retries.get(event.path, 0) + event.retries
+            if event.usage_point_id is not None:
+                meter = self.meter_latency.setdefault(event.usage_point_id, [0, 0.0])
+                meter[0] += 1
+                meter[1] += event.duration
+
+    def on_refresh(self):
+        with self._lock:
+            self.refreshes += 1
+
+    def to_openmetrics(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# TYPE pylinky_request_duration_seconds histogram")
+            lines.append("# UNIT pylinky_request_duration_seconds seconds")
+            for endpoint, (counts, total) in sorted(self.latency.items()):
+                bounds = [str(b) for b in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, counts):
+                    lines.append("pylinky_request_duration_seconds_bucket{} {}".format(
+                        _labels(endpoint=endpoint, le=bound), count))
+                lines.append("pylinky_request_duration_seconds_sum{} {}".format(_labels(endpoint=endpoint), total))
+                lines.append("pylinky_request_duration_seconds_count{} {}".format(
+                    _labels(endpoint=endpoint), counts[-1]))
+
+            lines.append("# TYPE pylinky_requests counter")
+            for (endpoint, status), count in sorted(self.statuses.items()):
+                lines.append("pylinky_requests_total{} {}".format(_labels(endpoint=endpoint, status=status), count))
+
+            lines.append("# TYPE pylinky_response_bytes counter")
+            lines.append("# UNIT pylinky_response_bytes bytes")
+            for endpoint, count in sorted(self.bytes.items()):
+                lines.append("pylinky_response_bytes_total{} {}".format(_labels(endpoint=endpoint), count))
+
+            lines.append("# TYPE pylinky_retries counter")
+            for endpoint, count in sorted(self.retries.items()):
+                lines.append("pylinky_retries_total{} {}".format(_labels(endpoint=endpoint), count))
+
+            lines.append("# TYPE pylinky_meter_request_duration_seconds summary")
+            for usage_point_id, (count, total) in sorted(self.meter_latency.items()):
+                labels = _labels(usage_point_id=usage_point_id)
+                lines.append("pylinky_meter_request_duration_seconds_sum{} {}".format(labels, total))
+                lines.append("pylinky_meter_request_duration_seconds_count{} {}".format(labels, count))
+
+            lines.append("# TYPE pylinky_token_refreshes counter")
+            lines.append("pylinky_token_refreshes_total {}".format(self.refreshes))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
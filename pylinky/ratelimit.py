@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+from .exceptions import PyLinkyMaintenanceException
+
+# Enedis Data Connect quotas: 5 calls per second, 10000 calls per hour
+DEFAULT_QUOTAS = ((5, 1), (10000, 3600))
+
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAINTENANCE_STATUSES = (500, 503)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIME = 300
+
+
+class RateLimiter(object):
+    """Token buckets shared by every call made through it.
+
+    quotas is a list of (calls, period in seconds); a call goes through once
+    a token is available in every bucket.
+    """
+
+    def __init__(self, quotas: Iterable[Tuple[float, float]] = DEFAULT_QUOTAS):
+        self._buckets = [[float(calls), float(calls) / period, float(calls)] for calls, period in quotas]
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token from every bucket, return how long to wait before the call."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated_at
+            self._updated_at = now
+            wait = 0.0
+            for bucket in self._buckets:
+                capacity, rate, tokens = bucket
+                tokens = min(capacity, tokens + elapsed * rate) - 1
+                bucket[2] = tokens
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RetryPolicy(object):
+    """Exponential backoff with full jitter, honoring Retry-After."""
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX, statuses: Iterable[int] = RETRY_STATUSES):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.statuses = frozenset(statuses)
+
+    def should_retry(self, attempt: int, status_code: Optional[int] = None) -> bool:
+        """status_code None stands for a connection error."""
+        return attempt < self.max_retries and (status_code is None or status_code in self.statuses)
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker(object):
+    """Stop calling Enedis while it is in maintenance.
+
+    After failure_threshold consecutive calls ending with a maintenance answer
+    once retried, the circuit opens and calls fail fast with
+    PyLinkyMaintenanceException for recovery_time seconds; then calls go
+    through again and the first maintenance answer opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 recovery_time: float = DEFAULT_RECOVERY_TIME):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.recovery_time
+
+    def check(self):
+        """Raise PyLinkyMaintenanceException while the circuit is open."""
+        if self.is_open:
+            raise PyLinkyMaintenanceException("Site in maintenance, not calling Enedis for now")
+
+    def record(self, status_code: Optional[int]):
+        with self._lock:
+            if status_code in MAINTENANCE_STATUSES:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+            else:
+                self._failures = 0
+                self._opened_at = None
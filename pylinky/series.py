@@ -0,0 +1,243 @@
+import datetime
+import itertools
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RAW = 'raw'
+TIME_OF_DAY = 'time_of_day'
+DAY = 'day'
+MONTH = 'month'
+YEAR = 'year'
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_SECONDS_PER_DAY = 86400
+
+_TIME_DIRECTIVES = ('%H', '%I', '%M', '%S', '%p', '%X', '%c', '%f', '%T', '%R')
+_DAY_DIRECTIVES = ('%d', '%e', '%j', '%a', '%A', '%w', '%u', '%U', '%W', '%V', '%x', '%c', '%D', '%F')
+_MONTH_DIRECTIVES = ('%m', '%b', '%B', '%h')
+_YEAR_DIRECTIVES = ('%y', '%Y', '%G', '%C')
+
+
+def _has(time_format, directives):
+    return any(directive in time_format for directive in directives)
+
+
+def reduction_for(time_format):
+    """Coarsest bucket a time_format can tell apart.
+
+    Readings falling in the same bucket always format to the same label, so
+    they can be summed before formatting.
+    """
+    has_time = _has(time_format, _TIME_DIRECTIVES)
+    has_day = _has(time_format, _DAY_DIRECTIVES)
+    has_month = _has(time_format, _MONTH_DIRECTIVES)
+    if has_time:
+        if has_day or has_month or _has(time_format, _YEAR_DIRECTIVES):
+            return RAW
+        return TIME_OF_DAY
+    if has_day:
+        return DAY
+    if has_month:
+        return MONTH
+    return YEAR
+
+
+def parse_timestamp(date):
+    """Epoch seconds of a "YYYY-MM-DD[ HH:MM:SS]" string, read as UTC."""
+    days = datetime.date(int(date[0:4]), int(date[5:7]), int(date[8:10])).toordinal() - _EPOCH_ORDINAL
+    seconds = days * _SECONDS_PER_DAY
+    if len(date) > 10:
+        seconds += int(date[11:13]) * 3600 + int(date[14:16]) * 60 + int(date[17:19])
+    return seconds
+
+
+def _to_datetime(timestamp):
+    return _EPOCH + datetime.timedelta(seconds=int(timestamp))
+
+
+class ReadingSeries(object):
+    """Columnar interval readings: int64 epoch timestamps and int64 values.
+
+    Dates are read as naive wall-clock times (stored as if UTC) so bucketing
+    matches the dates Enedis returns. NumPy arrays are used when NumPy is
+    installed, array.array otherwise.
+    """
+
+    def __init__(self, timestamps, values):
+        self.timestamps = timestamps
+        self.values = values
+
+    @classmethod
+    def from_interval_reading(cls, interval_reading):
+        """Parse the interval_reading list of a meter reading once."""
+        dates = [p['date'] for p in interval_reading]
+        values = [int(p['value']) for p in interval_reading]
+        if numpy is not None:
+            return cls(numpy.array(dates, dtype='datetime64[s]').astype(numpy.int64),
+                       numpy.array(values, dtype=numpy.int64))
+        return cls(array('q', map(parse_timestamp, dates)), array('q', values))
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Build from an iterable of (epoch timestamp, value), e.g. a streamed response."""
+        timestamps = array('q')
+        values = array('q')
+        for timestamp, value in pairs:
+            timestamps.append(timestamp)
+            values.append(value)
+        if numpy is not None:
+            return cls(numpy.frombuffer(timestamps, dtype=numpy.int64), numpy.frombuffer(values, dtype=numpy.int64))
+        return cls(timestamps, values)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def group(self, reduction=RAW):
+        """Sum values per bucket.
+
+        Returns (bucket timestamps, sums) with buckets in order of first
+        appearance in the series.
+        """
+        if numpy is not None and isinstance(self.timestamps, numpy.ndarray):
+            return self._group_numpy(reduction)
+        return self._group_python(reduction)
+
+    def _group_numpy(self, reduction):
+        keys = self.timestamps
+        if reduction == TIME_OF_DAY:
+            keys = keys % _SECONDS_PER_DAY
+        elif reduction == DAY:
+            keys = keys - keys % _SECONDS_PER_DAY
+        elif reduction in (MONTH, YEAR):
+            unit = 'datetime64[M]' if reduction == MONTH else 'datetime64[Y]'
+            keys = keys.astype('datetime64[s]').astype(unit).astype('datetime64[s]').astype(numpy.int64)
+
+        buckets, first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+        sums = numpy.bincount(inverse.ravel(), weights=self.values, minlength=len(buckets)).astype(numpy.int64)
+        order = numpy.argsort(first, kind='stable')
+        return buckets[order], sums[order]
+
+    def _group_python(self, reduction):
+        sums = {}
+        if reduction == TIME_OF_DAY:
+            keys = (t % _SECONDS_PER_DAY for t in self.timestamps)
+        elif reduction == RAW:
+            keys = iter(self.timestamps)
+        else:
+            keys = (t - t % _SECONDS_PER_DAY for t in self.timestamps)
+
+        for key, value in zip(keys, self.values):
+            sums[key] = sums.get(key, 0) + value
+
+        if reduction in (MONTH, YEAR):
+            days = sums
+            sums = {}
+            for key, value in days.items():
+                date = datetime.date.fromordinal(key // _SECONDS_PER_DAY + _EPOCH_ORDINAL)
+                date = date.replace(day=1) if reduction == MONTH else date.replace(month=1, day=1)
+                key = (date.toordinal() - _EPOCH_ORDINAL) * _SECONDS_PER_DAY
+                sums[key] = sums.get(key, 0) + value
+
+        return array('q', sums.keys()), array('q', sums.values())
+
+    def aggregate(self, time_format):
+        """Return (label, total) pairs, labels formatted with time_format."""
+        buckets, sums = self.group(reduction_for(time_format))
+        result = {}
+        for bucket, total in zip(buckets, sums):
+            key = _to_datetime(bucket).strftime(time_format)
+            result[key] = result.get(key, 0) + int(total)
+        return list(result.items())
+
+
+class MeterReading(object):
+    """A stored meter reading: metadata, readings parsed once and formatted views.
+
+    Formatted views are memoized per time format and shared between callers,
+    they must not be modified.
+    """
+
+    __slots__ = ('raw', 'usage_point_id', 'period_type', 'start', 'end', 'unit', '_series', '_missing', '_views')
+
+    def __init__(self, raw, period_type=None):
+        self.raw = raw
+        self.usage_point_id = raw.get('usage_point_id')
+        self.period_type = period_type
+        self.start = raw.get('start')
+        self.end = raw.get('end')
+        self.unit = (raw.get('reading_type') or {}).get('unit')
+        self._series = None
+        self._missing = None
+        self._views = {}
+
+    @property
+    def series(self):
+        if self._series is None:
+            self._series = ReadingSeries.from_interval_reading(self.raw.get('interval_reading', []))
+        return self._series
+
+    @property
+    def missing(self):
+        """Epoch timestamps of the readings absent from [start, end)."""
+        if self._missing is None:
+            from .gaps import missing_timestamps
+            self._missing = missing_timestamps(self.raw, timestamps=self.series.timestamps)
+        return self._missing
+
+    def gaps(self):
+        """Missing readings as (first, last) date ranges."""
+        from .gaps import find_gaps
+        return find_gaps(self.raw)
+
+    def __len__(self):
+        return len(self.raw.get('interval_reading', []))
+
+    def __iter__(self):
+        """Yield (epoch timestamp, value) pairs."""
+        series = self.series
+        return zip(map(int, series.timestamps), map(int, series.values))
+
+    def view(self, time_format, empty_buckets=False):
+        """Readings summed per time_format label, as [{"time": label, "conso": total}].
+
+        Buckets missing some of their readings are flagged "incomplete". With
+        empty_buckets, buckets missing all of them are listed too, in order,
+        as {"time": label, "conso": None, "incomplete": True}.
+        """
+        key = (time_format, empty_buckets)
+        view = self._views.get(key)
+        if view is None:
+            view = self._format(time_format, empty_buckets)
+            self._views[key] = view
+        return view
+
+    def _format(self, time_format, empty_buckets):
+        aggregate = self.series.aggregate(time_format)
+        if not self.missing:
+            return [{"time": key, "conso": conso} for key, conso in aggregate]
+
+        missing = ReadingSeries.from_pairs((t, 0) for t in self.missing)
+        incomplete = set(key for key, _ in missing.aggregate(time_format))
+        totals = dict(aggregate)
+        if empty_buckets:
+            # Missing readings are only used to list the empty buckets in order
+            pairs = sorted(itertools.chain(self, ((t, 0) for t in self.missing)))
+            keys = [key for key, _ in ReadingSeries.from_pairs(pairs).aggregate(time_format)]
+        else:
+            keys = [key for key, _ in aggregate]
+        view = []
+        for key in keys:
+            bucket = {"time": key, "conso": totals.get(key)}
+            if key in incomplete:
+                bucket["incomplete"] = True
+            view.append(bucket)
+        return view
+
+    def __repr__(self):
+        return "MeterReading({!r}, {!r}, {!r}, {!r}, readings={})".format(
+            self.usage_point_id, self.period_type, self.start, self.end, len(self))
@@ -0,0 +1,80 @@
+import codecs
+import json
+from typing import Iterable, Iterator, Tuple, Union
+
+from .exceptions import PyLinkyException
+from .series import parse_timestamp
+
+_KEY = '"interval_reading"'
+_WHITESPACE = ' \t\n\r'
+
+_decoder = json.JSONDecoder()
+
+
+def iter_interval_reading(chunks: Iterable[Union[bytes, str]]) -> Iterator[dict]:
+    """Yield the points of meter_reading.interval_reading as the body arrives.
+
+    chunks is the response body in pieces (e.g. Response.iter_content()), only
+    the point being decoded is kept in memory. A body without interval_reading
+    is decoded whole so Enedis errors are reported as usual.
+    """
+    # Imported here, linkyapi imports this module
+    from .linkyapi import parse_meter_reading
+
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = -1
+    chunks = iter(chunks)
+    exhausted = False
+
+    def more():
+        nonlocal buffer, exhausted
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            buffer += utf8.decode(b'', final=True)
+            return
+        buffer += utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    # Find the opening bracket of the interval_reading array
+    while position < 0:
+        position = buffer.find(_KEY)
+        if position >= 0:
+            position = buffer.find('[', position + len(_KEY))
+        if position < 0:
+            if exhausted:
+                parse_meter_reading(200, buffer)
+                return
+            more()
+    buffer = buffer[position + 1:]
+
+    while True:
+        stripped = buffer.lstrip(_WHITESPACE + ',')
+        if not stripped:
+            if exhausted:
+                raise PyLinkyException("Truncated response while reading interval_reading")
+            buffer = ''
+            more()
+            continue
+        if stripped[0] == ']':
+            return
+        try:
+            point, end = _decoder.raw_decode(stripped)
+        except ValueError:
+            if exhausted:
+                raise PyLinkyException("Impossible to decode response: " + stripped[:200])
+            buffer = stripped
+            more()
+            continue
+        buffer = stripped[end:]
+        yield point
+
+
+def iter_readings(chunks: Iterable[Union[bytes, str]]) -> Iterator[Tuple[int, int]]:
+    """Yield (epoch timestamp, value) pairs from a streamed metering response.
+
+    Timestamps are read as naive wall-clock times, as in ReadingSeries.
+    """
+    for point in iter_interval_reading(chunks):
+        yield parse_timestamp(point['date']), int(point['value'])
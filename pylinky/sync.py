@@ -0,0 +1,49 @@
+import json
+import os
+import threading
+
+from .files import write_json
+
+
+class SyncState(object):
+    """High-water marks of incremental syncs, per usage point and endpoint.
+
+    The date of the last reading stored for each (usage point, SCOPE key) is
+    kept in memory and, when a path is given, saved to a JSON file after every
+    update.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._marks = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._marks = json.load(f)
+
+    @staticmethod
+    def _key(usage_point_id, scope):
+        return usage_point_id + "/" + scope
+
+    def get(self, usage_point_id, scope):
+        """Return the date of the last reading synced, or None."""
+        with self._lock:
+            return self._marks.get(self._key(usage_point_id, scope))
+
+    def set(self, usage_point_id, scope, date):
+        with self._lock:
+            self._marks[self._key(usage_point_id, scope)] = date
+            self._save()
+
+    def reset(self, usage_point_id=None, scope=None):
+        """Forget marks, of one usage point and/or endpoint or all of them."""
+        with self._lock:
+            for key in list(self._marks):
+                upid, key_scope = key.split("/", 1)
+                if usage_point_id in (None, upid) and scope in (None, key_scope):
+                    del self._marks[key]
+            self._save()
+
+    def _save(self):
+        if self.path is not None:
+            write_json(self.path, self._marks)
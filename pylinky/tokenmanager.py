@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Union
+
+# Refresh that many seconds before the access token expires
+DEFAULT_REFRESH_MARGIN = 60
+
+
+class TokenManager(object):
+    """Thread-safe access token refresh shared by every user of an AbstractAuth.
+
+    Concurrent refresh attempts for the same token are merged into a single
+    call of refresh behind a lock; callers pass the generation of the token
+    they used and only the first one to get the lock actually refreshes.
+    Tokens are refreshed ahead of expires_at, on demand through ensure_valid
+    and, once start() has been called, from a background thread.
+    """
+
+    def __init__(
+        self,
+        get_token: Callable[[], Optional[Dict[str, Union[str, int]]]],
+        refresh: Callable[[], Dict[str, Union[str, int]]],
+        margin: int = DEFAULT_REFRESH_MARGIN
+    ):
+        self._get_token = get_token
+        self._refresh = refresh
+        self.margin = margin
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+    def _expires_at(self):
+        token = self._get_token()
+        if not token or token.get('expires_at') is None:
+            return None
+        return float(token['expires_at'])
+
+    def _needs_refresh(self):
+        expires_at = self._expires_at()
+        return expires_at is not None and expires_at - self.margin <= time.time()
+
+    def ensure_valid(self) -> int:
+        """Refresh if the token is about to expire, return the generation to use."""
+        generation = self.generation
+        if self._needs_refresh():
+            self.refresh(generation)
+        return self.generation
+
+    def refresh(self, generation: Optional[int] = None) -> int:
+        """Refresh the token unless it changed since generation was read.
+
+        Return the generation of the current token.
+        """
+        with self._lock:
+            if generation is None or generation == self.generation:
+                self._refresh()
+                self.generation += 1
+                self._wakeup.set()
+            return self.generation
+
+    def token_changed(self):
+        """Tell the manager a new token was set outside of refresh."""
+        with self._lock:
+            self.generation += 1
+            self._wakeup.set()
+
+    def start(self):
+        """Refresh ahead of expiry from a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="pylinky-token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped:
+            expires_at = self._expires_at()
+            timeout = None if expires_at is None else max(expires_at - self.margin - time.time(), 0)
+            if timeout is None or timeout > 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+            try:
+                self.ensure_valid()
+                failed = self._needs_refresh()
+            except Exception:
+                failed = True
+            if failed:
+                # Requests will retry the refresh on demand, don't spin
+                self._wakeup.wait(self.margin)
+                self._wakeup.clear()
@@ -0,0 +1,345 @@
+"""Tokens shared by several processes.
+
+A token store keeps versioned values that processes read and replace with an
+atomic compare-and-swap. refresh_shared uses it so that only one process
+refreshes a token at a time: it takes a lease on the token, and the others
+wait for it then adopt the new token without calling Enedis.
+
+Each customer consent has its own token, stored under its own key.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .exceptions import PyLinkyException
+from .files import write_json
+
+# Seconds a process may hold the refresh of a token before others take over,
+# longer than the (10, 60) default timeouts of AbstractAuth
+DEFAULT_LEASE = 120
+LEASE_POLL = 0.1
+
+class WatchError(Exception):
+    """A watched key changed before EXEC, raised by LocalRedis like redis.exceptions.WatchError."""
+
+
+def _watch_error(client):
+    """WatchError class raised by a Redis client, redis is only imported when used."""
+    if isinstance(client, LocalRedis):
+        return WatchError
+    try:
+        from redis.exceptions import WatchError as RedisWatchError
+    except ImportError:
+        return WatchError
+    return RedisWatchError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class TokenStore(object):
+    """Versioned JSON values, version 0 meaning absent."""
+
+    def read(self, key):
+        """Return (value, version)."""
+        raise NotImplementedError
+
+    def compare_and_swap(self, key, version, value):
+        """Store value if the stored version is still version, return whether it was stored."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryTokenStore(TokenStore):
+    """Store shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def read(self, key):
+        with self._lock:
+            return self._values.get(key, (None, 0))
+
+    def compare_and_swap(self, key, version, value):
+        with self._lock:
+            if self._values.get(key, (None, 0))[1] != version:
+                return False
+            self._values[key] = (value, version + 1)
+            return True
+
+
+class FileTokenStore(TokenStore):
+    """JSON file, updated under an exclusive lock on path + ".lock" (POSIX)."""
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise PyLinkyException("FileTokenStore requires fcntl, use SQLiteTokenStore")
+        self.path = path
+        self._lock_path = path + ".lock"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def read(self, key):
+        with self._locked():
+            entry = self._load().get(key)
+        if entry is None:
+            return None, 0
+        return entry['value'], entry['version']
+
+    def compare_and_swap(self, key, version, value):
+        with self._locked():
+            entries = self._load()
+            if entries.get(key, {}).get('version', 0) != version:
+                return False
+            entries[key] = {'value': value, 'version': version + 1}
+            write_json(self.path, entries)
+            return True
+
+
+class SQLiteTokenStore(TokenStore):
+    """SQLite file, safe across processes of one host."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        import sqlite3
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript(_SCHEMA)
+
+    def read(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, version FROM tokens WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def compare_and_swap(self, key, version, value):
+        with self._lock, self._conn:
+            if version == 0:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO tokens VALUES (?, ?, 1)", (key, json.dumps(value)))
+            else:
+                cursor = self._conn.execute("UPDATE tokens SET value = ?, version = ? WHERE key = ? AND version = ?",
+                                            (json.dumps(value), version + 1, key, version))
+            return cursor.rowcount == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisTokenStore(TokenStore):
+    """Redis, or any client with the redis-py GET and WATCH/MULTI/EXEC pipeline API."""
+
+    def __init__(self, client, prefix="pylinky:token:"):
+        self._client = client
+        self.prefix = prefix
+
+    def read(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return None, 0
+        entry = json.loads(raw)
+        return entry['value'], entry['version']
+
+    def compare_and_swap(self, key, version, value):
+        name = self.prefix + key
+        watch_error = _watch_error(self._client)
+        with self._client.pipeline() as pipe:
+            try:
+                pipe.watch(name)
+                raw = pipe.get(name)
+                if (json.loads(raw)['version'] if raw is not None else 0) != version:
+                    return False
+                pipe.multi()
+                pipe.set(name, json.dumps({'value': value, 'version': version + 1}))
+                pipe.execute()
+                return True
+            except watch_error:
+                return False
+
+
+class LocalRedis(object):
+    """In-process stand-in for a Redis client, enough for RedisTokenStore."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        # key -> number of writes, what WATCH compares
+        self._writes = {}
+
+    def get(self, name):
+        with self._lock:
+            return self._values.get(name)
+
+    def set(self, name, value):
+        with self._lock:
+            self._values[name] = value
+            self._writes[name] = self._writes.get(name, 0) + 1
+        return True
+
+    def pipeline(self):
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline(object):
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._watched = {}
+        self._commands = None
+
+    def watch(self, name):
+        with self._redis._lock:
+            self._watched[name] = self._redis._writes.get(name, 0)
+
+    def get(self, name):
+        return self._redis.get(name)
+
+    def multi(self):
+        self._commands = []
+
+    def set(self, name, value):
+        self._commands.append((name, value))
+
+    def execute(self):
+        redis = self._redis
+        with redis._lock:
+            if any(redis._writes.get(name, 0) != writes for name, writes in self._watched.items()):
+                raise WatchError("Watched variable changed.")
+            for name, value in self._commands:
+                redis._values[name] = value
+                redis._writes[name] = redis._writes.get(name, 0) + 1
+        self.reset()
+        return [True] * len(self._commands or [])
+
+    def reset(self):
+        self._watched = {}
+        self._commands = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+
+def _access_token(token):
+    return (token or {}).get('access_token')
+
+
+def token_grant(token):
+    """Identify the customer consent of a token, None when it can't be told.
+
+    Enedis tokens list the usage points they give access to, a digest of the
+    refresh token is used otherwise.
+    """
+    token = token or {}
+    if token.get('usage_points_id'):
+        return "usage_points:" + token['usage_points_id']
+    if token.get('refresh_token'):
+        return "refresh_token:" + hashlib.sha256(token['refresh_token'].encode("utf-8")).hexdigest()[:16]
+    return None
+
+
+def default_token_key(client_id, token):
+    """Store key of a token: its application and its customer consent."""
+    grant = token_grant(token)
+    if grant is None:
+        raise PyLinkyException("Can't tell the consent of the token, pass a token_key")
+    return "{}/{}".format(client_id or "default", grant)
+
+
+def _same_grant(token, other):
+    # Refresh tokens may be rotated, only usage points tell two consents apart
+    usage_points = (token or {}).get('usage_points_id')
+    other_usage_points = (other or {}).get('usage_points_id')
+    return not usage_points or not other_usage_points or usage_points == other_usage_points
+
+
+def store_token(store, key, token):
+    """Replace the stored token, e.g. after the authorization code flow."""
+    while True:
+        _, version = store.read(key)
+        if store.compare_and_swap(key, version, {'token': token, 'lease_until': 0}):
+            return
+
+
+def refresh_shared(store, key, token, refresh, lease=DEFAULT_LEASE):
+    """Return a token newer than token, refreshed by one process at a time.
+
+    When another process already stored a newer token it is returned as is.
+    Otherwise the caller takes a lease, calls refresh() and stores its result;
+    processes finding a lease wait for the new token, or for the lease to
+    expire if its holder died. lease must outlast a refresh call.
+    A stored token of another customer consent raises PyLinkyException.
+    """
+    while True:
+        value, version = store.read(key)
+        stored = value['token'] if value else None
+        if stored is not None and _access_token(stored) != _access_token(token):
+            if not _same_grant(stored, token):
+                raise PyLinkyException("Token store key {} holds the token of another consent".format(key))
+            return stored
+        if value and value.get('lease_until', 0) > time.time():
+            time.sleep(LEASE_POLL)
+            continue
+        current = stored if stored is not None else token
+        if not store.compare_and_swap(key, version, {'token': current, 'lease_until': time.time() + lease}):
+            continue
+
+        try:
+            new_token = refresh()
+        except BaseException:
+            # Let another process try
+            store.compare_and_swap(key, version + 1, {'token': current, 'lease_until': 0})
+            raise
+        return _publish(store, key, version + 1, token, new_token)
+
+
+def _publish(store, key, version, token, new_token):
+    """Store new_token, refreshed under the lease taken at version.
+
+    If the lease expired during the refresh, another process may have
+    refreshed too and its token is the one Enedis still accepts: it is
+    returned instead, once its refresh is over.
+    """
+    while not store.compare_and_swap(key, version, {'token': new_token, 'lease_until': 0}):
+        while True:
+            value, version = store.read(key)
+            stored = value['token'] if value else None
+            if stored is not None and _access_token(stored) not in (_access_token(token), _access_token(new_token)):
+                return stored
+            if not value or value.get('lease_until', 0) <= time.time():
+                break
+            time.sleep(LEASE_POLL)
+    return new_token
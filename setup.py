@@ -6,8 +6,8 @@ from os import path
 here = path.abspath(path.dirname(__file__))
 
 
-if sys.version_info < (3, 4):
-    sys.exit('Sorry, Python < 3.4 is not supported')
+if sys.version_info < (3, 8):
+    sys.exit('Sorry, Python < 3.8 is not supported')
 
 # Get the long description from the README file
 with open(path.join(here, 'README.rst'), encoding='utf-8') as f:
@@ -30,10 +30,17 @@ setup(
           ]
       },
       license='Apache 2.0',
+      python_requires='>=3.8',
       install_requires=['python-dateutil', 'requests', 'simplejson', 'requests_oauthlib', 'oauthlib'],
+      extras_require={
+          'async': ['aiohttp'],
+          'numpy': ['numpy'],
+          'parquet': ['pyarrow'],
+      },
       classifiers=[
-          'Programming Language :: Python :: 3.5',
-          'Programming Language :: Python :: 3.6',
-          'Programming Language :: Python :: 3.7',
+          'Programming Language :: Python :: 3.8',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
       ]
 )
@@ -0,0 +1,43 @@
+import unittest
+
+import requests
+
+from pylinky.abstractauth import AbstractAuth, make_adapter
+
+
+class AbstractAuthTestCase(unittest.TestCase):
+
+    def test_shared_adapter(self):
+        adapter = make_adapter(pool_maxsize=20)
+        first = AbstractAuth(adapter=adapter)
+        second = AbstractAuth(adapter=adapter)
+        assert first._oauth.get_adapter("https://gw.hml.api.enedis.fr") is adapter
+        assert second._oauth.get_adapter("https://gw.hml.api.enedis.fr") is adapter
+
+        first.close()
+        assert second._oauth.get_adapter("https://gw.hml.api.enedis.fr") is adapter
+
+    def test_request_options(self):
+        calls = []
+        auth = AbstractAuth(timeout=5, compress=True, keep_alive=False, sandbox=False)
+        auth._oauth.request = lambda *args, **kwargs: (calls.append((args, kwargs)),
+                                                       type('Response', (), {'status_code': 200})())[1]
+        auth.request("/v4/metering_data/daily_consumption", {'usage_point_id': '123'})
+
+        args, kwargs = calls[0]
+        assert args[1] == "https://gw.prd.api.enedis.fr/v4/metering_data/daily_consumption"
+        assert kwargs['timeout'] == 5
+        assert kwargs['headers']['Accept-Encoding'] == "gzip, deflate"
+        assert kwargs['headers']['Connection'] == "close"
+
+    def test_compression_disabled(self):
+        auth = AbstractAuth(compress=False)
+        auth._oauth.token = {'access_token': 'token', 'token_type': 'Bearer'}
+        request = requests.Request("GET", "https://gw.hml.api.enedis.fr/v4/metering_data/daily_consumption",
+                                   headers=auth._headers)
+        assert auth._oauth.prepare_request(request).headers['Accept-Encoding'] == "identity"
+        auth.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import time
+import unittest
+
+from benchmarks.mock_enedis import MockEnedisServer
+from pylinky.exceptions import PyLinkyEnedisException
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class FakeAsyncAPI(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def get_usage_point_ids(self):
+        return ["123"]
+
+    async def get_metering_data_range(self, scope, upid, start, end):
+        self.calls.append((scope, upid, start, end))
+        await asyncio.sleep(0)
+        points = [{"date": "2000-01-01", "value": "1"}, {"date": end, "value": "2"}]
+        return {"interval_reading": points, "start": start, "end": end}
+
+
+class FakeAsyncResponse(object):
+    status = 200
+    headers = {}
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class AsyncLinkyClientTestCase(unittest.TestCase):
+
+    def test_async_fetch_data(self):
+        from pylinky.aioabstractauth import AsyncAbstractAuth
+        from pylinky.aioclient import AsyncLinkyClient
+
+        client = AsyncLinkyClient(AsyncAbstractAuth())
+        client._api = FakeAsyncAPI()
+        asyncio.run(client.async_fetch_data())
+
+        assert sorted(client._data) == ["daily", "hourly", "monthly", "yearly"]
+        assert all(call[1] == "123" for call in client._api.calls)
+        assert client._data["hourly"]["period_type"] == "hourly"
+        assert sorted(client.get_data()) == ["daily", "hourly", "monthly", "yearly"]
+        # Only the async fetches are offered
+        assert not hasattr(client, "fetch_data") and not hasattr(client, "sync")
+
+    def test_async_fetch_data_derive_aggregates(self):
+        from pylinky.aioabstractauth import AsyncAbstractAuth
+        from pylinky.aioclient import AsyncLinkyClient
+
+        client = AsyncLinkyClient(AsyncAbstractAuth())
+        client._api = FakeAsyncAPI()
+        asyncio.run(client.async_fetch_data(derive_aggregates=True))
+
+        assert sorted(call[0] for call in client._api.calls) == ["CONSUMPTION_LOAD_CURVE", "DAILY_CONSUMPTION"]
+        assert sorted(client._data) == ["daily", "hourly", "monthly", "yearly"]
+        for t in ["daily", "monthly", "yearly"]:
+            data = client._data[t]
+            assert all(data["start"] <= p["date"] < data["end"] for p in data["interval_reading"])
+
+    def test_auth_runs_in_successive_loops(self):
+        from pylinky.aioabstractauth import AsyncAbstractAuth
+        from pylinky.ratelimit import RateLimiter
+
+        auth = AsyncAbstractAuth(max_concurrency=2, rate_limiter=RateLimiter(quotas=[]))
+        in_flight = []
+
+        async def send(url, arguments):
+            in_flight.append(url)
+            await asyncio.sleep(0.01)
+            in_flight.remove(url)
+            return FakeAsyncResponse()
+
+        async def fetch_all():
+            # More requests than max_concurrency, some wait on the semaphore
+            return await asyncio.gather(*[auth.request("/{}".format(i), {}) for i in range(5)])
+
+        auth._send = send
+        for _ in range(2):
+            assert len(asyncio.run(fetch_all())) == 5
+        assert not in_flight
+
+    def test_metering_data_range_against_mock_server(self):
+        from pylinky.aioabstractauth import AsyncAbstractAuth
+        from pylinky.aiolinkyapi import AsyncLinkyAPI
+        from pylinky.ratelimit import RateLimiter
+
+        with MockEnedisServer(["1", "2"], latency=0.01) as server:
+            token = server.token()
+            # Expired, the first request refreshes it
+            token['expires_at'] = time.time() - 1
+            auth = AsyncAbstractAuth(token=token, base_url=server.base_url, max_concurrency=2,
+                                     rate_limiter=RateLimiter(quotas=[]))
+            api = AsyncLinkyAPI(auth)
+            in_flight = []
+            most_in_flight = []
+            get = auth._get
+
+            async def counting_get(url, arguments):
+                in_flight.append(url)
+                most_in_flight.append(len(in_flight))
+                try:
+                    return await get(url, arguments)
+                finally:
+                    in_flight.remove(url)
+
+            auth._get = counting_get
+
+            async def fetch(upids, end):
+                try:
+                    return await asyncio.gather(*[api.get_metering_data_range(
+                        "CONSUMPTION_LOAD_CURVE", upid, "2020-01-01", end) for upid in upids])
+                finally:
+                    await api.close_session()
+
+            # 30 days of load curve are 5 chunks per meter
+            readings = asyncio.run(fetch(["1", "2"], "2020-01-31"))
+            refreshed = auth.token
+            # No consent for this meter, the 403 refreshes the token and retries once
+            with self.assertRaisesRegex(PyLinkyEnedisException, "no consent"):
+                asyncio.run(fetch(["3"], "2020-01-02"))
+
+        for upid, reading in zip(["1", "2"], readings):
+            assert reading["usage_point_id"] == upid
+            assert (reading["start"], reading["end"]) == ("2020-01-01", "2020-01-31")
+            assert len(reading["interval_reading"]) == 30 * 48
+        assert len(most_in_flight) == 12 and max(most_in_flight) == 2
+        assert refreshed["access_token"] != token["access_token"]
+        assert auth.token["access_token"] != refreshed["access_token"]
+        # A refresh and 10 chunks, then a refresh and 2 tries for meter 3
+        assert server.requests == 1 + 10 + 1 + 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+from datetime import date
+
+from pylinky.client import LinkyClient, HOURLY, DAILY
+
+from tests.test_linkyapi import FakeAuth, FakeResponse
+
+
+class FailingAuth(FakeAuth):
+
+    def request(self, path, arguments):
+        if arguments['usage_point_id'] == "bad":
+            return FakeResponse('{"error": "ADAM-ERR0123", "error_description": "unknown meter"}', 400)
+        return FakeAuth.request(self, path, arguments)
+
+
+class CountingAuth(FakeAuth):
+
+    def __init__(self):
+        FakeAuth.__init__(self)
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def request(self, path, arguments):
+        with self._count_lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            time.sleep(0.01)
+            return FakeAuth.request(self, path, arguments)
+        finally:
+            with self._count_lock:
+                self.in_flight -= 1
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def test_fetch_batch(self):
+        auth = FailingAuth()
+        client = LinkyClient(auth)
+        results = client.fetch_batch(["1", "bad", "2"], period_types=[HOURLY, DAILY])
+
+        assert sorted(results) == ["1", "2", "bad"]
+        assert results["1"].ok and results["2"].ok
+        assert sorted(results["1"].data) == [DAILY, HOURLY]
+        assert results["1"].data[HOURLY]["period_type"] == HOURLY
+        assert not results["bad"].ok
+        assert "unknown meter" in str(results["bad"].errors[DAILY])
+        assert set(call[1]["usage_point_id"] for call in auth.calls) == {"1", "2"}
+
+    def test_requests_in_flight_bounded_by_max_workers(self):
+        auth = CountingAuth()
+        client = LinkyClient(auth)
+        # 30 days of load curve are 5 chunks per meter
+        results = client.fetch_batch(["1", "2", "3"], period_types=[HOURLY], start=date(2020, 1, 1), end=date(2020, 1, 31),
+                                     max_workers=2)
+
+        assert all(result.ok for result in results.values())
+        assert len(auth.calls) == 15
+        assert auth.most_in_flight == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
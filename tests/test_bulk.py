@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pylinky.bulk import aggregate_bodies, aggregate_files
+from pylinky.client import DAILY, HOURLY, MONTHLY, _MAP, _FORMAT
+from pylinky.series import MeterReading
+
+from benchmarks.mock_enedis import meter_reading
+
+
+def body(usage_point_id, path="/v4/metering_data/daily_consumption", start="2020-01-01", end="2020-03-01"):
+    return json.dumps({"meter_reading": meter_reading(path, usage_point_id, start, end)})
+
+
+class BulkTestCase(unittest.TestCase):
+
+    def _expected(self, text, period_type):
+        return MeterReading(json.loads(text)["meter_reading"], period_type).view(_MAP[_FORMAT][period_type])
+
+    def test_aggregate_bodies(self):
+        bodies = [body("{:014d}".format(i)) for i in range(5)]
+        for processes in (1, 2):
+            results = aggregate_bodies(bodies, MONTHLY, processes=processes)
+            assert [r.usage_point_id for r in results] == ["{:014d}".format(i) for i in range(5)]
+            for text, result in zip(bodies, results):
+                assert result.view() == self._expected(text, MONTHLY)
+
+    def test_aggregate_files(self):
+        directory = tempfile.mkdtemp()
+        bodies = [body("1", "/v4/metering_data/consumption_load_curve", "2020-01-01", "2020-01-03"),
+                  body("2", "/v4/metering_data/consumption_load_curve", "2020-01-01", "2020-01-03")]
+        paths = []
+        for i, text in enumerate(bodies):
+            paths.append(os.path.join(directory, "{}.json".format(i)))
+            with open(paths[-1], "w") as f:
+                f.write(text)
+        results = aggregate_files(paths, HOURLY, processes=2)
+        assert results[1].view() == self._expected(bodies[1], HOURLY)
+        assert len(results[0].view()) == 48
+        assert aggregate_files(paths[:1], DAILY, time_format="%Y")[0].aggregate()[0][0] == "2020"
+
+
+if __name__ == "__main__":
+    unittest.main()
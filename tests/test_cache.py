@@ -0,0 +1,85 @@
+import datetime
+import json
+import unittest
+
+from pylinky.cache import MeteringCache, day_range, group_days, reading_day
+from pylinky.linkyapi import LinkyAPI
+
+from tests.test_linkyapi import FakeAuth, FakeResponse
+
+
+class EveryDayAuth(FakeAuth):
+    """One reading on every day of the requested window."""
+
+    def request(self, path, arguments):
+        self.calls.append((path, dict(arguments)))
+        points = [{"date": day + " 12:00:00", "value": "1"} for day in day_range(arguments['start'], arguments['end'])]
+        return FakeResponse(json.dumps({"meter_reading": {"interval_reading": points}}))
+
+
+class MeteringCacheTestCase(unittest.TestCase):
+
+    def test_helpers(self):
+        assert day_range("2020-01-30", "2020-02-02") == ["2020-01-30", "2020-01-31", "2020-02-01"]
+        assert group_days(["2020-01-01", "2020-01-02", "2020-01-05"]) == [
+            ("2020-01-01", "2020-01-03"), ("2020-01-05", "2020-01-06")]
+        assert reading_day("2020-01-02 00:00:00") == "2020-01-01"
+        assert reading_day("2020-01-02 00:30:00") == "2020-01-02"
+        assert reading_day("2020-01-02") == "2020-01-02"
+
+    def test_only_missing_days_are_fetched(self):
+        auth = FakeAuth()
+        api = LinkyAPI(auth, cache=MeteringCache())
+
+        first = api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-10")
+        assert len(auth.calls) == 2
+        second = api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-10")
+        assert len(auth.calls) == 2
+        assert first == second
+
+        api.get_consumption_load_curve_range("123", "2020-01-05", "2020-01-12")
+        assert len(auth.calls) == 3
+        assert auth.calls[-1][1]['start'] == "2020-01-10"
+        assert auth.calls[-1][1]['end'] == "2020-01-12"
+
+    def test_mutable_days_expire(self):
+        today = datetime.date.today()
+        start = (today - datetime.timedelta(days=3)).strftime("%Y-%m-%d")
+        end = (today + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        auth = EveryDayAuth()
+        api = LinkyAPI(auth, cache=MeteringCache(mutable_ttl=-1))
+
+        api.get_consumption_load_curve_range("123", start, end)
+        api.get_consumption_load_curve_range("123", start, end)
+        assert auth.calls[-1][1]['start'] == (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def test_empty_days_expire(self):
+        auth = FakeAuth()
+        request = auth.request
+
+        def unpublished(path, arguments):
+            response = request(path, arguments)
+            if len(auth.calls) == 1:
+                response.text = '{"meter_reading": {"interval_reading": []}}'
+            return response
+
+        auth.request = unpublished
+        api = LinkyAPI(auth, cache=MeteringCache(mutable_ttl=-1), response_ttl=0)
+        assert api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-02")['interval_reading'] == []
+        # Published since: requested again, then kept
+        assert len(api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-02")['interval_reading']) == 2
+        api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-02")
+        assert len(auth.calls) == 2
+
+    def test_eviction(self):
+        cache = MeteringCache(max_readings=2)
+        api = LinkyAPI(FakeAuth(), cache=cache)
+        api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-02")
+        api.get_consumption_load_curve_range("123", "2020-01-05", "2020-01-06")
+        days = day_range("2020-01-01", "2020-01-06")
+        assert cache.missing_days("123", "CONSUMPTION_LOAD_CURVE", days) == [
+            "2020-01-01", "2020-01-02", "2020-01-03", "2020-01-04"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,58 +1,81 @@
+import os
 import unittest
-import requests_mock
-import responses
 
-# Our test case class
-import requests
-from pylinky import LinkyClient
-from pylinky.client import LOGIN_URL
+from pylinky import AbstractAuth, LinkyClient
+from pylinky.client import HOURLY, DAILY, MONTHLY, YEARLY
+from pylinky.exceptions import PyLinkyException
+from pylinky.ratelimit import RateLimiter
+
+from benchmarks.mock_enedis import MockEnedisServer
 
 
 class LinkyClientTestCase(unittest.TestCase):
 
-    def test_LinkyClient(self):
-        username = "test_login"
-        password = "test_password"
-        client = LinkyClient(username, password)
-        assert client.username == username
-        assert client.password == password
-        assert client._timeout is None
+    @classmethod
+    def setUpClass(cls):
+        cls._insecure = os.environ.get('OAUTHLIB_INSECURE_TRANSPORT')
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+        cls.server = MockEnedisServer(["12345678901234"]).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        if cls._insecure is None:
+            del os.environ['OAUTHLIB_INSECURE_TRANSPORT']
 
-    def test_LinkyClientWithTimeout(self):
-        username = "test_login"
-        password = "test_password"
+    def _auth(self, token=None):
+        return AbstractAuth(token=token or self.server.token(), client_id="id", client_secret="secret",
+                            base_url=self.server.base_url, rate_limiter=RateLimiter(quotas=[]))
+
+    def test_LinkyClient(self):
+        auth = self._auth()
+        client = LinkyClient(auth)
+        assert client._api._auth is auth
+        assert client._data == {}
 
-        client = LinkyClient(username, password, timeout=1)
-        assert client.username == username
-        assert client.password == password
-        assert client._timeout == 1
+    def test_fetch_data(self):
+        client = LinkyClient(self._auth())
+        requests = self.server.requests
+        client.fetch_data()
+        data = client.get_data()
+        client.close_session()
 
-    def test_LinkyClientWithSession(self):
-        username = "test_login"
-        password = "test_password"
-        session = requests.session()
+        assert sorted(data) == sorted([HOURLY, DAILY, MONTHLY, YEARLY])
+        assert len(data[HOURLY]) == 48
+        # From 30 days ago to yesterday
+        assert len(data[DAILY]) == 29
+        assert all(set(point) == {"time", "conso"} for point in data[DAILY])
+        # 3 years of daily data are fetched in 365 days chunks
+        assert self.server.requests - requests > 4
 
-        client = LinkyClient(username, password, session=session)
-        assert client.username == username
-        assert client.password == password
-        assert client._session == session
+    def test_fetch_data_derive_aggregates(self):
+        client = LinkyClient(self._auth())
+        client.fetch_data()
+        expected = client.get_data()
 
-    @requests_mock.Mocker()
-    def test_login(self, m):
-        cookies = {'iPlanetDirectoryPro': 'test'}
+        requests = self.server.requests
+        client.fetch_data(derive_aggregates=True)
+        data = client.get_data()
+        client.close_session()
 
-        m.register_uri('POST', LOGIN_URL, status_code=200, cookies=cookies)
-        client = LinkyClient("test_login", "test_password")
+        assert data == expected
+        assert self.server.requests - requests < 6
 
-        client.login()
+    def test_response_cache_disabled(self):
+        client = LinkyClient(self._auth(), response_ttl=0)
+        client.get_data_per_period(DAILY)
+        requests = self.server.requests
+        client.get_data_per_period(DAILY)
+        client.close_session()
+        assert self.server.requests > requests
 
-    def test(self):
-        data = None
-        if not data:
-            assert True
-        else:
-            assert False
+    def test_no_usage_point(self):
+        token = self.server.token()
+        del token['usage_points_id']
+        client = LinkyClient(self._auth(token))
+        self.assertRaises(PyLinkyException, client.fetch_data)
+        client.close_session()
 
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+from pylinky.customer import CustomerCache, CustomerStore
+from pylinky.exceptions import PyLinkyEnedisException, PyLinkyException
+
+
+class FakeResponse(object):
+
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+class FakeAPI(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def _answer(self, name, usage_point_id):
+        self.calls.append((name, usage_point_id))
+        if usage_point_id == "no-contract" and name == "contracts":
+            return FakeResponse('{"error": "ADAM-ERR0069", "error_description": "no consent"}', 403)
+        return FakeResponse('{"customer": {"customer_id": "-1", "name": "%s"}}' % name)
+
+    def get_customer_identity(self, usage_point_id):
+        return self._answer("identity", usage_point_id)
+
+    def get_customer_contact_data(self, usage_point_id):
+        return self._answer("contact_data", usage_point_id)
+
+    def get_customer_usage_points_contracts(self, usage_point_id):
+        return self._answer("contracts", usage_point_id)
+
+    def get_customer_usage_points_addresses(self, usage_point_id):
+        return self._answer("addresses", usage_point_id)
+
+
+class CustomerCacheTestCase(unittest.TestCase):
+
+    def test_lazy_profile(self):
+        api = FakeAPI()
+        profile = CustomerCache(api).profile("1")
+        assert api.calls == []
+        assert profile.identity['customer']['name'] == "identity"
+        assert profile.identity['customer']['name'] == "identity"
+        assert api.calls == [("identity", "1")]
+
+        data = profile.load()
+        assert sorted(data) == ['ADDRESSES', 'CONTACT_DATA', 'CONTRACTS', 'IDENTITY']
+        assert len(api.calls) == 4
+
+        profile.invalidate()
+        profile.contracts
+        assert len(api.calls) == 5
+
+    def test_ttl_and_lru(self):
+        api = FakeAPI()
+        customers = CustomerCache(api, ttl=0)
+        customers.get("1", 'IDENTITY')
+        customers.get("1", 'IDENTITY')
+        assert len(api.calls) == 2
+
+        customers = CustomerCache(api, max_profiles=2)
+        for usage_point_id in ("1", "2", "1", "3"):
+            customers.get(usage_point_id, 'IDENTITY')
+        del api.calls[:]
+        customers.get("1", 'IDENTITY')
+        customers.get("2", 'IDENTITY')
+        assert api.calls == [("identity", "2")]
+
+    def test_store(self):
+        api = FakeAPI()
+        path = os.path.join(tempfile.mkdtemp(), "customers.db")
+        CustomerCache(api, store=CustomerStore(path)).profile("1").load()
+        assert len(api.calls) == 4
+
+        profile = CustomerCache(api, store=CustomerStore(path)).profile("1")
+        assert profile.addresses['customer']['name'] == "addresses"
+        assert len(api.calls) == 4
+
+    def test_errors(self):
+        api = FakeAPI()
+        profile = CustomerCache(api, max_workers=1).profile("no-contract")
+        self.assertRaises(PyLinkyEnedisException, profile.load)
+
+        data = profile.load(return_exceptions=True)
+        assert isinstance(data['CONTRACTS'], PyLinkyException)
+        assert data['IDENTITY']['customer']['name'] == "identity"
+        del api.calls[:]
+        profile.load(return_exceptions=True)
+        assert api.calls == [("contracts", "no-contract")]
+
+
+if __name__ == "__main__":
+    unittest.main()
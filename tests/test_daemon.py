@@ -0,0 +1,86 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+from pylinky.daemon import Poller, TokenFile, published_until
+
+
+class FakeClient(object):
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = failing
+
+    def get_usage_point_ids(self):
+        return ["1", "2", "3"]
+
+    def sync(self, scope, usage_point_id, end=None):
+        if usage_point_id in self.failing:
+            raise IOError("unreachable")
+        self.calls.append((usage_point_id, scope, end))
+        return {'interval_reading': []}
+
+
+class Clock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def epoch(*args):
+    return time.mktime(datetime.datetime(*args).timetuple())
+
+
+class PollerTestCase(unittest.TestCase):
+
+    def test_published_until(self):
+        assert published_until(epoch(2020, 3, 5, 7, 59)) == datetime.date(2020, 3, 4)
+        assert published_until(epoch(2020, 3, 5, 8, 0)) == datetime.date(2020, 3, 5)
+
+    def test_slots_are_spread(self):
+        poller = Poller(FakeClient(), spread=3600)
+        day = datetime.date(2020, 3, 5)
+        slots = set(poller.slot("{:014d}".format(i), day) for i in range(100))
+        assert len(slots) > 90
+        assert all(epoch(2020, 3, 5, 8) <= slot < epoch(2020, 3, 5, 9) for slot in slots)
+        assert poller.slot("1", day) == poller.slot("1", day)
+
+    def test_run_pending(self):
+        clock = Clock(epoch(2020, 3, 5, 7))
+        client = FakeClient(failing=("2",))
+        poller = Poller(client, usage_point_ids=["1", "2"], scopes=('DAILY_CONSUMPTION',), spread=3600,
+                        retry_delay=600, clock=clock)
+        poller.schedule()
+        # Nothing before the publication of the previous day
+        assert poller.run_pending() == 0
+        assert epoch(2020, 3, 5, 8) <= poller.next_due() < epoch(2020, 3, 5, 9)
+
+        clock.now = epoch(2020, 3, 5, 9)
+        assert poller.run_pending() == 1
+        assert client.calls == [("1", 'DAILY_CONSUMPTION', datetime.date(2020, 3, 5))]
+        # "2" failed and is retried later, "1" waits for tomorrow
+        assert poller.next_due() == clock.now + 600
+        assert sorted(due for due, _ in poller._schedule)[1] >= epoch(2020, 3, 6, 8)
+
+    def test_token_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "token.json")
+        tokens = TokenFile(path)
+        tokens.save({"access_token": "a"})
+        assert tokens.load() == {"access_token": "a"}
+        tokens.save({"access_token": "b"})
+        assert tokens.load() == {"access_token": "b"}
+        assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+    def test_schedule_every_usage_point_of_the_token(self):
+        poller = Poller(FakeClient(), clock=Clock(time.time()))
+        poller.schedule()
+        assert sorted(upid for _, upid in poller._schedule) == ["1", "2", "3"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from pylinky import AbstractAuth, export
+from pylinky.client import DAILY, MONTHLY, YEARLY, LinkyClient
+from pylinky.export import CsvSink, ParquetSink
+from pylinky.ratelimit import RateLimiter
+
+from benchmarks.mock_enedis import MockEnedisServer
+from tests.test_linkyapi import FakeAuth
+
+METER_READING = {
+    "usage_point_id": "123",
+    "reading_type": {"unit": "W"},
+    "interval_reading": [
+        {"date": "2020-01-01 00:30:00", "value": "10", "measure_type": "B"},
+        {"date": "2020-01-01 01:00:00", "value": "20", "measure_type": "B"},
+    ],
+}
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def test_csv_sink_appends_new_readings_only(self):
+        directory = tempfile.mkdtemp()
+        sink = CsvSink(directory)
+        assert sink.write_meter_reading(METER_READING, 'CONSUMPTION_LOAD_CURVE') == 2
+        assert sink.write_meter_reading(METER_READING, 'CONSUMPTION_LOAD_CURVE') == 0
+        assert CsvSink(directory).write('123', 'CONSUMPTION_LOAD_CURVE', [(1577838600, 5), (1577842200, 30)],
+                                        unit='W') == 1
+
+        path = os.path.join(sink.partition('123', 'CONSUMPTION_LOAD_CURVE'), 'readings.csv')
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        assert rows == [['timestamp', 'value', 'unit', 'measure_type'],
+                        ['1577838600', '10', 'W', 'B'],
+                        ['1577840400', '20', 'W', 'B'],
+                        ['1577842200', '30', 'W', '']]
+
+    def test_older_readings_are_appended(self):
+        directory = tempfile.mkdtemp()
+        sink = CsvSink(directory)
+        assert sink.write('123', 'DAILY_CONSUMPTION', [(1577923200, 2)]) == 1
+        assert sink.write('123', 'DAILY_CONSUMPTION', [(1577836800, 1), (1577923200, 2), (1577836800, 1)]) == 1
+        # Written timestamps are read back from the files
+        assert CsvSink(directory, max_partitions=1).write('123', 'DAILY_CONSUMPTION',
+                                                          [(1577836800, 1), (1578009600, 3)]) == 1
+
+    @unittest.skipIf(export.pyarrow is None, "pyarrow is not installed")
+    def test_parquet_sink(self):
+        directory = tempfile.mkdtemp()
+        sink = ParquetSink(directory)
+        sink.write_meter_reading(METER_READING, 'CONSUMPTION_LOAD_CURVE')
+        sink.write('123', 'CONSUMPTION_LOAD_CURVE', [(1577842200, 30)], unit='W', measure_type='B')
+        assert ParquetSink(directory).write_meter_reading(METER_READING, 'CONSUMPTION_LOAD_CURVE') == 0
+
+        table = export.pyarrow.parquet.read_table(sink.partition('123', 'CONSUMPTION_LOAD_CURVE'))
+        assert table.schema.field('timestamp').type == export.pyarrow.timestamp('ms')
+        assert sorted(table.column('value').to_pylist()) == [10, 20, 30]
+
+    def test_client_exports_fetched_data(self):
+        directory = tempfile.mkdtemp()
+        sink = CsvSink(directory)
+        client = LinkyClient(FakeAuth(), sinks=[sink])
+        client._get_data('urlCdcHeure', "2020-01-01", "2020-01-02", usage_point_id="123")
+        assert os.path.exists(os.path.join(sink.partition('123', 'CONSUMPTION_LOAD_CURVE'), 'readings.csv'))
+
+    def test_client_exports_every_period(self):
+        insecure = os.environ.get('OAUTHLIB_INSECURE_TRANSPORT')
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+        directory = tempfile.mkdtemp()
+        try:
+            with MockEnedisServer(["12345678901234"]) as server:
+                auth = AbstractAuth(token=server.token(), base_url=server.base_url,
+                                    rate_limiter=RateLimiter(quotas=[]))
+                client = LinkyClient(auth, sinks=[CsvSink(directory)], response_ttl=0)
+                client.fetch_data()
+                dates = set(p['date'] for t in [DAILY, MONTHLY, YEARLY]
+                            for p in client._data[t]['interval_reading'])
+                # Periods of one meter written concurrently to the same partition
+                result = client.fetch_batch(["12345678901234"], period_types=(DAILY, MONTHLY, YEARLY))
+                assert result["12345678901234"].ok
+                client.close_session()
+        finally:
+            if insecure is None:
+                del os.environ['OAUTHLIB_INSECURE_TRANSPORT']
+
+        path = os.path.join(CsvSink(directory).partition("12345678901234", 'DAILY_CONSUMPTION'), 'readings.csv')
+        with open(path) as f:
+            timestamps = [row[0] for row in csv.reader(f)][1:]
+        assert len(dates) > 1000
+        assert len(timestamps) == len(set(timestamps)) == len(dates)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import unittest
+
+from pylinky.gaps import find_gaps, gap_windows, reading_step
+from pylinky.linkyapi import LinkyAPI
+from pylinky.series import MeterReading
+
+
+def load_curve(start, end, dates):
+    return {"start": start, "end": end,
+            "interval_reading": [{"date": date, "value": "1", "interval_length": "PT30M"} for date in dates]}
+
+
+def half_hours(day):
+    return ["{} {:02d}:{:02d}:00".format(day, minutes // 60, minutes % 60) for minutes in range(30, 24 * 60, 30)]
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.text = body
+
+
+class HoleyAuth(object):
+    """Drops the readings of 2020-01-02 from the first answer covering that day."""
+
+    def __init__(self):
+        self.calls = []
+
+    def request(self, path, arguments):
+        self.calls.append((arguments['start'], arguments['end']))
+        dates = []
+        for day in ("2020-01-01", "2020-01-02", "2020-01-03"):
+            if arguments['start'] <= day < arguments['end']:
+                if day == "2020-01-02" and len(self.calls) == 1:
+                    continue
+                dates += half_hours(day)
+                dates.append(day[:8] + "{:02d} 00:00:00".format(int(day[8:]) + 1))
+        return FakeResponse(json.dumps({"meter_reading": load_curve(arguments['start'], arguments['end'], dates)}))
+
+
+class GapsTestCase(unittest.TestCase):
+
+    def test_find_gaps(self):
+        dates = half_hours("2020-01-01") + ["2020-01-02 00:00:00"]
+        del dates[3:5]
+        meter_reading = load_curve("2020-01-01", "2020-01-02", dates)
+        assert find_gaps(meter_reading) == [("2020-01-01 02:00:00", "2020-01-01 02:30:00")]
+        assert find_gaps(meter_reading, end="2020-01-03")[-1] == ("2020-01-02 00:30:00", "2020-01-03 00:00:00")
+
+        daily = {"start": "2020-01-01", "end": "2020-01-05",
+                 "interval_reading": [{"date": "2020-01-01", "value": "1"}, {"date": "2020-01-04", "value": "1"}]}
+        assert reading_step(daily) == 86400
+        assert find_gaps(daily) == [("2020-01-02", "2020-01-03")]
+
+    def test_dst_days(self):
+        # 02:00 and 02:30 don't exist on 2020-03-29, 02:30 is repeated on 2020-10-25
+        spring = [date for date in half_hours("2020-03-29") if date[11:13] != "02"] + ["2020-03-30 00:00:00"]
+        assert len(spring) == 46
+        assert find_gaps(load_curve("2020-03-29", "2020-03-30", spring)) == []
+        autumn = half_hours("2020-10-25") + ["2020-10-25 02:30:00", "2020-10-25 03:00:00", "2020-10-26 00:00:00"]
+        assert find_gaps(load_curve("2020-10-25", "2020-10-26", autumn)) == []
+        assert find_gaps(load_curve("2020-03-29", "2020-03-30", spring[1:])) == [
+            ("2020-03-29 00:30:00", "2020-03-29 00:30:00")]
+
+    def test_unpublished_window_is_empty(self):
+        assert MeterReading(load_curve("2020-01-01", "2020-01-02", [])).view("%H:%M") == []
+
+    def test_gap_windows(self):
+        assert gap_windows([("2020-01-01 02:00:00", "2020-01-01 02:30:00"),
+                            ("2020-01-02 00:30:00", "2020-01-03 00:00:00")]) == [("2020-01-01", "2020-01-03")]
+        assert gap_windows([("2020-01-02", "2020-01-03"), ("2020-01-05", "2020-01-05")]) == [
+            ("2020-01-02", "2020-01-04"), ("2020-01-05", "2020-01-06")]
+
+    def test_fill_gaps_refetches_missing_days_only(self):
+        auth = HoleyAuth()
+        api = LinkyAPI(auth)
+        meter_reading = api.get_metering_data_range('CONSUMPTION_LOAD_CURVE', "123", "2020-01-01", "2020-01-04",
+                                                    fill_gaps=True)
+        assert auth.calls == [("2020-01-01", "2020-01-04"), ("2020-01-02", "2020-01-03")]
+        assert len(meter_reading['interval_reading']) == 3 * 48
+        assert find_gaps(meter_reading) == []
+
+    def test_incomplete_buckets(self):
+        dates = half_hours("2020-01-01") + ["2020-01-02 00:00:00"]
+        daily = {"start": "2020-01-01", "end": "2020-01-04",
+                 "interval_reading": [{"date": "2020-01-01", "value": "3"}, {"date": "2020-01-03", "value": "5"}]}
+        assert MeterReading(daily).view("%d") == [{"time": "01", "conso": 3}, {"time": "03", "conso": 5}]
+        assert MeterReading(daily).view("%d", empty_buckets=True) == [
+            {"time": "01", "conso": 3}, {"time": "02", "conso": None, "incomplete": True}, {"time": "03", "conso": 5}]
+        assert MeterReading(daily).view("%b") == [{"time": "Jan", "conso": 8, "incomplete": True}]
+        assert all("incomplete" not in bucket
+                   for bucket in MeterReading(load_curve("2020-01-01", "2020-01-02", dates)).view("%H:%M"))
+
+
+if __name__ == "__main__":
+    unittest.main()
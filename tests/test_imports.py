@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once a request is made or data is formatted
+HEAVY = ['requests', 'requests_oauthlib', 'oauthlib', 'simplejson', 'dateutil', 'http.client', 'asyncio', 'aiohttp',
+         'numpy', 'pyarrow', 'redis']
+
+
+def loaded_modules(statement):
+    code = statement + "\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    output = subprocess.check_output([sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=ROOT))
+    return set(json.loads(output))
+
+
+class ImportsTestCase(unittest.TestCase):
+
+    def assert_light(self, statement):
+        heavy = loaded_modules(statement).intersection(HEAVY)
+        assert not heavy, "{} imports {}".format(statement, sorted(heavy))
+
+    def test_package(self):
+        self.assert_light("import pylinky")
+
+    def test_client_constants(self):
+        self.assert_light("from pylinky.client import HOURLY")
+
+    def test_cli(self):
+        self.assert_light("import pylinky.__main__")
+
+    def test_exports_still_resolve(self):
+        modules = loaded_modules("from pylinky import AbstractAuth, LinkyAPI, LinkyClient")
+        assert 'requests' not in modules
+        assert {'pylinky.abstractauth', 'pylinky.linkyapi', 'pylinky.client'} <= modules
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import unittest
+
+from pylinky.linkyapi import LinkyAPI, RequestCoalescer, split_range, merge_meter_readings
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.text = body
+
+
+class FakeAuth(object):
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, path, arguments):
+        with self._lock:
+            self.calls.append((path, dict(arguments)))
+        start = arguments['start']
+        points = [{"date": start + " 00:30:00", "value": "1"},
+                  {"date": start + " 01:00:00", "value": "2"}]
+        return FakeResponse(json.dumps({"meter_reading": {"start": start, "end": arguments['end'],
+                                                          "interval_reading": points}}))
+
+
+class LinkyAPITestCase(unittest.TestCase):
+
+    def test_split_range(self):
+        assert split_range("2020-01-01", "2020-01-16", 7) == [
+            ("2020-01-01", "2020-01-08"), ("2020-01-08", "2020-01-15"), ("2020-01-15", "2020-01-16")]
+        assert split_range("2020-01-01", "2020-01-01", 7) == []
+
+    def test_merge_meter_readings(self):
+        merged = merge_meter_readings([
+            {"start": "b", "end": "c", "interval_reading": [{"date": "2", "value": "2"}, {"date": "3", "value": "3"}]},
+            {"start": "a", "end": "b", "interval_reading": [{"date": "1", "value": "1"}, {"date": "2", "value": "9"}]},
+        ])
+        assert [p["date"] for p in merged["interval_reading"]] == ["1", "2", "3"]
+        assert merged["interval_reading"][1]["value"] == "2"
+
+    def test_load_curve_range_is_chunked(self):
+        auth = FakeAuth()
+        api = LinkyAPI(auth)
+        meter_reading = api.get_consumption_load_curve_range("123", "2020-01-01", "2020-01-31")
+
+        assert len(auth.calls) == 5
+        assert meter_reading["start"] == "2020-01-01"
+        assert meter_reading["end"] == "2020-01-31"
+        dates = [p["date"] for p in meter_reading["interval_reading"]]
+        assert dates == sorted(dates)
+        assert len(dates) == 10
+
+    def test_identical_requests_are_coalesced(self):
+        auth = FakeAuth()
+        api = LinkyAPI(auth)
+        api.get_daily_consumption("123", "2020-01-01", "2020-01-02")
+        api.get_daily_consumption("123", "2020-01-01", "2020-01-02")
+        api.get_daily_consumption("123", "2020-01-02", "2020-01-03")
+        assert len(auth.calls) == 2
+
+        auth = FakeAuth()
+        api = LinkyAPI(auth, response_ttl=0)
+        api.get_daily_consumption("123", "2020-01-01", "2020-01-02")
+        api.get_daily_consumption("123", "2020-01-01", "2020-01-02")
+        assert len(auth.calls) == 2
+
+    def test_list_arguments_are_coalesced(self):
+        auth = FakeAuth()
+        api = LinkyAPI(auth)
+        api.get_daily_consumption(["123"], "2020-01-01", "2020-01-02")
+        api.get_daily_consumption(["123"], "2020-01-01", "2020-01-02")
+        assert len(auth.calls) == 1
+
+    def test_coalescer_shares_in_flight_calls(self):
+        coalescer = RequestCoalescer(ttl=0)
+        calls = []
+        release = threading.Event()
+
+        def slow_call():
+            calls.append(1)
+            release.wait(5)
+            return "answer"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescer.call("key", slow_call)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert calls == [1]
+        assert results == ["answer"] * 4
+
+    def test_coalescer_does_not_cache_errors(self):
+        coalescer = RequestCoalescer(ttl=60)
+        self.assertRaises(IOError, coalescer.call, "key", self._fail)
+        assert coalescer.call("key", lambda: 404, lambda result: result == 200) == 404
+        assert coalescer.call("key", lambda: 200, lambda result: result == 200) == 200
+        assert coalescer.call("key", lambda: 500) == 200
+
+    @staticmethod
+    def _fail():
+        raise IOError("unreachable")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import unittest
+
+from pylinky import AbstractAuth
+from pylinky.linkyapi import SCOPE
+from pylinky.metrics import Metrics, RequestEvent, RequestObserver
+from pylinky.ratelimit import RateLimiter, RetryPolicy
+
+from benchmarks.mock_enedis import MockEnedisServer
+
+
+class Recorder(RequestObserver):
+
+    def __init__(self):
+        self.events = []
+        self.refreshes = 0
+
+    def on_request(self, event):
+        self.events.append(event)
+
+    def on_refresh(self):
+        self.refreshes += 1
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_metrics(self):
+        metrics = Metrics(buckets=(0.1, 1))
+        metrics.on_request(RequestEvent("/a", "1", 200, 0.05, bytes=10))
+        metrics.on_request(RequestEvent("/a", "1", 429, 0.5, bytes=5, retries=2))
+        metrics.on_request(RequestEvent("/b", None, None, 3, error=IOError()))
+        metrics.on_refresh()
+
+        assert metrics.latency["/a"][0] == [1, 2, 2]
+        assert metrics.statuses == {("/a", "200"): 1, ("/a", "429"): 1, ("/b", "error"): 1}
+        assert metrics.bytes["/a"] == 15
+        assert metrics.retries["/a"] == 2
+        assert metrics.meter_latency == {"1": [2, 0.55]}
+
+        text = metrics.to_openmetrics()
+        assert 'pylinky_request_duration_seconds_bucket{endpoint="/a",le="+Inf"} 2' in text
+        assert 'pylinky_requests_total{endpoint="/b",status="error"} 1' in text
+        assert 'pylinky_token_refreshes_total 1' in text
+        assert text.endswith("# EOF\n")
+
+        metrics.reset()
+        assert metrics.latency == {} and metrics.refreshes == 0
+
+    def test_auth_observers(self):
+        os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')
+        recorder = Recorder()
+        with MockEnedisServer(["12345678901234"]) as server:
+            auth = AbstractAuth(token=server.token(), base_url=server.base_url, observers=[recorder],
+                                rate_limiter=RateLimiter(quotas=[]), retry_policy=RetryPolicy(max_retries=0))
+            path = SCOPE['DAILY_CONSUMPTION']
+            auth.request(path, {'usage_point_id': "12345678901234", 'start': "2020-01-01", 'end': "2020-01-03"})
+            # Unknown usage points are answered with 403, which refreshes the token once
+            auth.request(path, {'usage_point_id': "00000000000000", 'start': "2020-01-01", 'end': "2020-01-03"})
+            auth.close()
+
+        ok, forbidden = recorder.events
+        assert (ok.path, ok.usage_point_id, ok.status_code, ok.retries) == (path, "12345678901234", 200, 0)
+        assert ok.bytes > 0 and ok.duration > 0
+        assert forbidden.status_code == 403
+        assert recorder.refreshes == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from pylinky.abstractauth import AbstractAuth
+from pylinky.exceptions import PyLinkyMaintenanceException
+from pylinky.ratelimit import RateLimiter, RetryPolicy, CircuitBreaker, parse_retry_after
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+class RateLimitTestCase(unittest.TestCase):
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter([(2, 1)])
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == 0
+        assert 0.4 < limiter.reserve() <= 0.5
+
+    def test_retry_policy(self):
+        policy = RetryPolicy(max_retries=2, backoff_base=1, backoff_max=10)
+        assert policy.should_retry(0, 429)
+        assert policy.should_retry(0)
+        assert not policy.should_retry(0, 404)
+        assert not policy.should_retry(2, 503)
+        assert policy.delay(0, "3") == 3
+        assert policy.delay(0, "120") == 10
+        assert 0 <= policy.delay(3) <= 8
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+        assert parse_retry_after("soon") is None
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_time=60)
+        breaker.record(500)
+        breaker.check()
+        breaker.record(503)
+        self.assertRaises(PyLinkyMaintenanceException, breaker.check)
+        breaker.record(200)
+        breaker.check()
+
+    def test_request_retries(self):
+        responses = [FakeResponse(429, {'Retry-After': '0'}), FakeResponse(503, {'Retry-After': '0'}),
+                     FakeResponse(200)]
+        auth = AbstractAuth(retry_policy=RetryPolicy(backoff_max=0))
+        auth._oauth.request = lambda *args, **kwargs: responses.pop(0)
+        assert auth.request("/path", {}).status_code == 200
+        assert responses == []
+
+    def test_request_circuit_breaker(self):
+        auth = AbstractAuth(retry_policy=RetryPolicy(max_retries=0),
+                            circuit_breaker=CircuitBreaker(failure_threshold=1))
+        auth._oauth.request = lambda *args, **kwargs: FakeResponse(500)
+        assert auth.request("/path", {}).status_code == 500
+        self.assertRaises(PyLinkyMaintenanceException, auth.request, "/path", {})
+
+    def test_failing_meter_does_not_open_the_circuit(self):
+        auth = AbstractAuth(retry_policy=RetryPolicy(backoff_max=0), rate_limiter=RateLimiter(quotas=[]))
+        calls = []
+
+        def answer(method, url, params=None, **kwargs):
+            calls.append(params['usage_point_id'])
+            return FakeResponse(500 if params['usage_point_id'] == "bad" else 200)
+
+        auth._oauth.request = answer
+        assert auth.request("/path", {'usage_point_id': "bad"}).status_code == 500
+        assert calls == ["bad"] * 5
+        assert not auth.circuit_breaker.is_open
+        for _ in range(3):
+            assert auth.request("/path", {'usage_point_id': "bad"}).status_code == 500
+            assert auth.request("/path", {'usage_point_id': "good"}).status_code == 200
+        assert not auth.circuit_breaker.is_open
+
+
+if __name__ == "__main__":
+    unittest.main()
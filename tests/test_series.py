@@ -0,0 +1,67 @@
+import unittest
+
+from pylinky import series
+from pylinky.client import LinkyClient, HOURLY
+from pylinky.series import MeterReading, ReadingSeries, reduction_for
+
+READINGS = [
+    {"date": "2020-01-31 23:30:00", "value": "1"},
+    {"date": "2020-02-01 00:00:00", "value": "2"},
+    {"date": "2020-02-01 00:30:00", "value": "4"},
+    {"date": "2020-02-02 00:30:00", "value": "8"},
+]
+
+
+class ReadingSeriesTestCase(unittest.TestCase):
+
+    def _check(self):
+        s = ReadingSeries.from_interval_reading(READINGS)
+        assert len(s) == 4
+        assert s.aggregate("%H:%M") == [("23:30", 1), ("00:00", 2), ("00:30", 12)]
+        assert s.aggregate("%d %b") == [("31 Jan", 1), ("01 Feb", 6), ("02 Feb", 8)]
+        assert s.aggregate("%b") == [("Jan", 1), ("Feb", 14)]
+        assert s.aggregate("%Y") == [("2020", 15)]
+
+    def test_aggregate(self):
+        self._check()
+
+    def test_aggregate_without_numpy(self):
+        numpy = series.numpy
+        series.numpy = None
+        try:
+            self._check()
+        finally:
+            series.numpy = numpy
+
+    def test_reduction_for(self):
+        assert reduction_for("%H:%M") == series.TIME_OF_DAY
+        assert reduction_for("%d %H:%M") == series.RAW
+        assert reduction_for("%d %b") == series.DAY
+        assert reduction_for("%b") == series.MONTH
+        assert reduction_for("%Y") == series.YEAR
+
+    def test_meter_reading(self):
+        raw = {"usage_point_id": "1", "start": "2020-01-31", "end": "2020-02-03",
+               "reading_type": {"unit": "W"}, "interval_reading": READINGS}
+        reading = MeterReading(raw, HOURLY)
+        assert (reading.usage_point_id, reading.unit, len(reading)) == ("1", "W", 4)
+        assert list(reading)[0] == (1580513400, 1)
+        assert reading.view("%b") is reading.view("%b")
+        assert not hasattr(reading, '__dict__')
+
+    def test_client_views_are_cached(self):
+        client = LinkyClient.__new__(LinkyClient)
+        client._data = {}
+        client._readings = {}
+        client._store_data(HOURLY, {"interval_reading": READINGS})
+        first = client.get_data()
+        assert client.get_data()[HOURLY] is first[HOURLY]
+        assert client.get_meter_reading(HOURLY).period_type == HOURLY
+
+        # Storing new data drops the views
+        client._store_data(HOURLY, {"interval_reading": READINGS[:1]})
+        assert client.get_data()[HOURLY] == [{"time": "23:30", "conso": 1}]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import unittest
+
+from pylinky.client import LinkyClient, HOURLY
+from pylinky.exceptions import PyLinkyEnedisException
+from pylinky.linkyapi import LinkyAPI
+from pylinky.stream import iter_interval_reading, iter_readings
+
+BODY = json.dumps({"meter_reading": {
+    "usage_point_id": "123", "start": "2020-01-01", "end": "2020-01-02", "quality": "BRUT",
+    "reading_type": {"unit": "W", "measurement_kind": "power", "aggregate": "average"},
+    "interval_reading": [{"value": str(i), "date": "2020-01-01 %02d:%02d:00" % divmod(30 * (i + 1), 60),
+                          "interval_length": "PT30M", "measure_type": "B"} for i in range(47)]
+}}, ensure_ascii=False).encode('utf-8')
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class FakeStreamResponse(object):
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self._body = body
+        self.text = body.decode('utf-8')
+
+    def iter_content(self, chunk_size):
+        return iter(chunked(self._body, 7))
+
+    def close(self):
+        pass
+
+
+class FakeStreamAuth(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def get_usage_point_ids(self):
+        return ["123"]
+
+    def request(self, path, arguments, stream=False):
+        self.calls.append(arguments)
+        return FakeStreamResponse(BODY)
+
+
+class StreamTestCase(unittest.TestCase):
+
+    def test_iter_interval_reading(self):
+        expected = json.loads(BODY.decode('utf-8'))['meter_reading']['interval_reading']
+        for size in (1, 3, 64, len(BODY)):
+            assert list(iter_interval_reading(chunked(BODY, size))) == expected
+
+    def test_iter_readings(self):
+        readings = list(iter_readings(chunked(BODY, 5)))
+        assert len(readings) == 47
+        assert readings[0] == (1577838600, 0)
+
+    def test_error_body(self):
+        body = b'{"error": "ADAM-ERR0069", "error_description": "no consent \xc3\xa9"}'
+        self.assertRaises(PyLinkyEnedisException, list, iter_interval_reading(chunked(body, 3)))
+
+    def test_stream_metering_data(self):
+        auth = FakeStreamAuth()
+        api = LinkyAPI(auth)
+        readings = list(api.stream_metering_data('CONSUMPTION_LOAD_CURVE', "123", "2020-01-01", "2020-01-15"))
+        assert len(auth.calls) == 2
+        assert len(readings) == 94
+
+    def test_format_streamed_data(self):
+        client = LinkyClient(FakeStreamAuth())
+        formatted = client.format_data(client.stream_data(HOURLY, start=None), period_type=HOURLY)
+        assert formatted[0] == {"time": "00:30", "conso": 0}
+        assert len(formatted) == 47
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from pylinky.client import LinkyClient
+from pylinky.sync import SyncState
+
+from tests.test_linkyapi import FakeAuth
+
+
+class SyncTestCase(unittest.TestCase):
+
+    def test_state_is_persisted(self):
+        path = os.path.join(tempfile.mkdtemp(), "sync.json")
+        state = SyncState(path)
+        state.set("123", "DAILY_CONSUMPTION", "2020-01-01")
+        assert SyncState(path).get("123", "DAILY_CONSUMPTION") == "2020-01-01"
+        state.reset(usage_point_id="123")
+        assert SyncState(path).get("123", "DAILY_CONSUMPTION") is None
+
+    def test_sync_only_fetches_new_readings(self):
+        auth = FakeAuth()
+        client = LinkyClient(auth)
+        today = datetime.date.today()
+
+        first = client.sync(usage_point_id="123", initial_days=3)
+        assert len(auth.calls) == 1
+        assert auth.calls[0][1]['start'] == (today - datetime.timedelta(days=3)).strftime("%Y-%m-%d")
+        assert len(first['interval_reading']) == 2
+
+        client._sync_state.set("123", "CONSUMPTION_LOAD_CURVE",
+                               (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d") + " 00:30:00")
+        second = client.sync(usage_point_id="123")
+        assert auth.calls[-1][1]['start'] == (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        assert [p['value'] for p in second['interval_reading']] == ["2"]
+
+
+if __name__ == "__main__":
+    unittest.main()
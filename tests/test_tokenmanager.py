@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from pylinky.abstractauth import AbstractAuth
+from pylinky.tokenmanager import TokenManager
+
+
+class TokenManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.token = {'access_token': 'a', 'expires_at': time.time() + 3600}
+        self.refreshes = 0
+
+    def _refresh(self):
+        time.sleep(0.01)
+        self.refreshes += 1
+        self.token = {'access_token': 'a' + str(self.refreshes), 'expires_at': time.time() + 3600}
+
+    def test_concurrent_refreshes_are_merged(self):
+        manager = TokenManager(lambda: self.token, self._refresh)
+        generation = manager.generation
+        threads = [threading.Thread(target=manager.refresh, args=(generation,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert self.refreshes == 1
+
+    def test_refresh_ahead_of_expiry(self):
+        manager = TokenManager(lambda: self.token, self._refresh, margin=60)
+        manager.ensure_valid()
+        assert self.refreshes == 0
+        self.token['expires_at'] = time.time() + 30
+        manager.ensure_valid()
+        assert self.refreshes == 1
+
+    def test_background_refresh(self):
+        self.token['expires_at'] = time.time() + 0.05
+        manager = TokenManager(lambda: self.token, self._refresh, margin=0)
+        manager.start()
+        try:
+            deadline = time.time() + 2
+            while self.refreshes == 0 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            manager.stop()
+        assert self.refreshes == 1
+
+
+class AbstractAuthRefreshTestCase(unittest.TestCase):
+
+    def test_expired_token_refreshed_once_for_concurrent_requests(self):
+        updates = []
+        auth = AbstractAuth(token={'access_token': 'a', 'refresh_token': 'r', 'expires_at': time.time() - 1},
+                            token_updater=updates.append)
+        auth.refresh_tokens = lambda: (updates.append('refreshed'), {'access_token': 'b', 'refresh_token': 'r',
+                                                                      'expires_at': time.time() + 3600})[1]
+        auth._oauth.request = lambda *args, **kwargs: type('Response', (), {'status_code': 200})()
+
+        threads = [threading.Thread(target=auth.request, args=("/path", {})) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert updates == ['refreshed']
+        assert auth._oauth.token['access_token'] == 'b'
+
+
+if __name__ == "__main__":
+    unittest.main()
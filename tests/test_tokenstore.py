@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from pylinky import AbstractAuth
+from pylinky.exceptions import PyLinkyException
+from pylinky.ratelimit import RateLimiter
+from pylinky.tokenstore import (FileTokenStore, LocalRedis, MemoryTokenStore, RedisTokenStore, SQLiteTokenStore,
+                                refresh_shared, store_token)
+
+from benchmarks.mock_enedis import MockEnedisServer
+
+OLD = {'access_token': 'old', 'refresh_token': 'r'}
+
+
+def _refresh_in_process(args):
+    path, log = args
+    store = FileTokenStore(path)
+
+    def refresh():
+        with open(log, "a") as f:
+            f.write("refresh\n")
+        time.sleep(0.2)
+        return {'access_token': 'new', 'refresh_token': 'r2'}
+
+    return refresh_shared(store, "key", OLD, refresh)['access_token']
+
+
+class TokenStoreTestCase(unittest.TestCase):
+
+    def _stores(self):
+        directory = tempfile.mkdtemp()
+        return [MemoryTokenStore(), FileTokenStore(os.path.join(directory, "tokens.json")),
+                SQLiteTokenStore(os.path.join(directory, "tokens.db")), RedisTokenStore(LocalRedis())]
+
+    def test_compare_and_swap(self):
+        for store in self._stores():
+            assert store.read("key") == (None, 0)
+            assert store.compare_and_swap("key", 0, {"a": 1})
+            assert not store.compare_and_swap("key", 0, {"a": 2})
+            assert store.read("key") == ({"a": 1}, 1)
+            assert store.compare_and_swap("key", 1, {"a": 3})
+            assert store.read("key") == ({"a": 3}, 2)
+            store.close()
+
+    def test_refreshed_once_across_threads(self):
+        for store in self._stores():
+            store_token(store, "key", OLD)
+            refreshes = []
+
+            def refresh():
+                refreshes.append(1)
+                time.sleep(0.05)
+                return {'access_token': 'new', 'refresh_token': 'r2'}
+
+            tokens = []
+            threads = [threading.Thread(target=lambda: tokens.append(refresh_shared(store, "key", dict(OLD), refresh)))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert refreshes == [1]
+            assert [t['access_token'] for t in tokens] == ['new'] * 8
+
+    def test_refreshed_once_across_processes(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "tokens.json")
+        log = os.path.join(directory, "refreshes.log")
+        with multiprocessing.Pool(4) as pool:
+            tokens = pool.map(_refresh_in_process, [(path, log)] * 4)
+        assert tokens == ['new'] * 4
+        with open(log) as f:
+            assert f.read() == "refresh\n"
+
+    def test_failed_refresh_releases_the_lease(self):
+        store = MemoryTokenStore()
+        store_token(store, "key", OLD)
+
+        def fail():
+            raise IOError("unreachable")
+
+        self.assertRaises(IOError, refresh_shared, store, "key", OLD, fail)
+        token = refresh_shared(store, "key", OLD, lambda: {'access_token': 'new'})
+        assert token['access_token'] == 'new'
+
+    def test_expired_lease_adopts_the_later_refresh(self):
+        store = MemoryTokenStore()
+        store_token(store, "key", OLD)
+
+        def slow_refresh():
+            time.sleep(0.3)
+            return {'access_token': 'slow'}
+
+        tokens = []
+        thread = threading.Thread(target=lambda: tokens.append(refresh_shared(store, "key", OLD, slow_refresh,
+                                                                              lease=0.1)))
+        thread.start()
+        time.sleep(0.15)
+        fast = refresh_shared(store, "key", OLD, lambda: {'access_token': 'fast'})
+        thread.join()
+        assert fast['access_token'] == 'fast'
+        assert tokens[0]['access_token'] == 'fast'
+        assert store.read("key")[0]['token']['access_token'] == 'fast'
+
+    def test_auth_picks_up_the_stored_token(self):
+        insecure = os.environ.get('OAUTHLIB_INSECURE_TRANSPORT')
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+        store = MemoryTokenStore()
+        try:
+            with MockEnedisServer() as server:
+                first = AbstractAuth(token=server.token(), client_id="app", base_url=server.base_url,
+                                     token_store=store, rate_limiter=RateLimiter(quotas=[]))
+                store_token(store, first.token_key, first._oauth.token)
+                second = AbstractAuth(client_id="app", base_url=server.base_url, token_store=store,
+                                      token_key=first.token_key, rate_limiter=RateLimiter(quotas=[]))
+                first._token_manager.refresh()
+                requests = server.requests
+                second._token_manager.refresh()
+                assert server.requests == requests
+                assert second._oauth.token == store.read(first.token_key)[0]['token']
+                first.close()
+                second.close()
+        finally:
+            if insecure is None:
+                del os.environ['OAUTHLIB_INSECURE_TRANSPORT']
+
+    def test_customers_of_one_application_keep_their_tokens(self):
+        store = MemoryTokenStore()
+        customers = []
+        for usage_point_id in ["111", "222"]:
+            token = {'access_token': 'a-' + usage_point_id, 'refresh_token': 'r-' + usage_point_id,
+                     'usage_points_id': usage_point_id}
+            auth = AbstractAuth(token=token, client_id="app", token_store=store)
+            auth.refresh_tokens = lambda usage_point_id=usage_point_id: {
+                'access_token': 'a2-' + usage_point_id, 'refresh_token': 'r2-' + usage_point_id,
+                'usage_points_id': usage_point_id}
+            store_token(store, auth.token_key, token)
+            customers.append(auth)
+
+        for auth in customers:
+            auth._refresh_session_token()
+        assert [auth.get_usage_point_ids() for auth in customers] == [['111'], ['222']]
+        assert [auth._oauth.token['access_token'] for auth in customers] == ['a2-111', 'a2-222']
+        for auth in customers:
+            auth.close()
+
+        self.assertRaises(PyLinkyException, AbstractAuth, client_id="app", token_store=store)
+
+    def test_another_consent_is_not_adopted(self):
+        store = MemoryTokenStore()
+        store_token(store, "key", {'access_token': 'a', 'usage_points_id': '111'})
+        self.assertRaises(PyLinkyException, refresh_shared, store, "key",
+                          {'access_token': 'b', 'usage_points_id': '222'}, lambda: {})
+
+
+if __name__ == "__main__":
+    unittest.main()